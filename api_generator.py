@@ -1,24 +1,42 @@
-import requests
-import json
+import atexit
+import httpx
+import orjson
+import os
 import time
 from pathlib import Path
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from config import API_BASE_URL, MODEL_NAME, SAMPLE_STRENGTH
+from config import API_BASE_URL, MODEL_NAME, SAMPLE_STRENGTH, HTTP_POOL_SIZE
+from retry_utils import backoff
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def create_retry_session() -> requests.Session:
-    """Create requests session with retry strategy"""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        status_forcelist=[429, 500, 502, 503, 504],
-        backoff_factor=1
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+DOWNLOAD_CHUNK_SIZE = 1 << 18  # 256 KiB: a few iterations per image instead of dozens
+
+def create_http_client() -> httpx.Client:
+    """Create HTTP/2 client with connection retries"""
+    # Pool limits go on the transport; httpx ignores Client(limits=...) when a transport is given
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+    )
+    return httpx.Client(
+        http2=True,
+        timeout=httpx.Timeout(300.0, connect=15.0),
+        transport=transport
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+
+# Shared by every call so the TLS session and HTTP/2 connection are reused
+_CLIENT = create_http_client()
+atexit.register(_CLIENT.close)
+
+def _request_with_retry(method: str, url: str, retries: int = 3, **kwargs) -> httpx.Response:
+    """Send request via shared client, retrying on transient status codes"""
+    for attempt in range(retries + 1):
+        resp = _CLIENT.request(method, url, **kwargs)
+        if resp.status_code not in RETRY_STATUS_CODES or attempt == retries:
+            return resp
+        time.sleep(backoff(attempt, base=1.0))
 
 def generate_image_via_api(prompt: str, 
                           session_id: str,
@@ -53,17 +71,16 @@ def generate_image_via_api(prompt: str,
             "sample_strength": SAMPLE_STRENGTH
         }
         
-        session = create_retry_session()
         print(f"   🎨 Generating {n} image(s) for: {prompt[:60]}...")
         
-        resp = session.post(
+        resp = _request_with_retry(
+            "POST",
             endpoint,
             headers=headers,
-            data=json.dumps(payload),
-            timeout=300
+            content=orjson.dumps(payload)
         )
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         
         if not data.get("data"):
             print(f"   ⚠️  No images returned for prompt")
@@ -77,22 +94,59 @@ def generate_image_via_api(prompt: str,
         print(f"   ❌ API error: {exc}")
         return []
 
-def download_image(url: str, output_path: Path, session: requests.Session = None) -> bool:
+def _write_all(fd: int, data: bytes):
+    """Write bytes to a raw file descriptor, handling short writes"""
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+def download_image(url: str, output_path: Path, client: httpx.Client = None) -> bool:
     """Download image from URL to file"""
+    part_path = None
     try:
-        if session is None:
-            session = create_retry_session()
-        
-        resp = session.get(url, stream=True, timeout=60)
-        resp.raise_for_status()
+        if client is None:
+            client = _CLIENT
         
         output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Stream into a side file so a failed download never leaves a truncated image behind
+        part_path = output_path.with_name(output_path.name + ".part")
         
-        with output_path.open("wb") as f:
-            for chunk in resp.iter_content(8192):
-                f.write(chunk)
+        with client.stream("GET", url, timeout=60) as resp:
+            resp.raise_for_status()
+            fd = os.open(part_path, _WRITE_FLAGS, 0o644)
+            try:
+                for chunk in resp.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    _write_all(fd, chunk)
+            finally:
+                os.close(fd)
         
+        os.replace(part_path, output_path)
         return True
     except Exception as exc:
         print(f"   ❌ Download failed: {exc}")
+        if part_path is not None:
+            part_path.unlink(missing_ok=True)
         return False
+
+def download_images(urls: list[str], output_paths: list[Path], client: httpx.Client = None) -> int:
+    """
+    Download several images concurrently over the shared client
+    
+    Args:
+        urls: Image URLs
+        output_paths: Target file for each URL (same order as urls)
+        client: Optional httpx client (defaults to the shared one)
+    
+    Returns:
+        Number of images downloaded successfully
+    """
+    if not urls:
+        return 0
+    
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        futures = [
+            pool.submit(download_image, url, path, client)
+            for url, path in zip(urls, output_paths)
+        ]
+        return sum(1 for future in as_completed(futures) if future.result())
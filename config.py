@@ -1,5 +1,6 @@
 # Configuration constants
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,25 +18,34 @@ MODEL_NAME = "jimeng-3.0"
 # Paths
 COOKIES_FOLDER = os.getenv('COOKIES_FOLDER', 'cookies')
 PROMPT_FILE = os.getenv('PROMPT_FILE', '')
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', 'outputs')
 
 # Generation Settings
 IMAGE_COUNT = int(os.getenv('IMAGE_COUNT', '4'))
+ASPECT_RATIO = os.getenv('ASPECT_RATIO', '16:9')  # Single ratio per worker, set by launcher
 SAMPLE_STRENGTH = 0.5
 CREDITS_PER_GENERATION = 5
+CREDIT_RECHECK_INTERVAL = 5  # Re-read credits from the browser every N generations
 
 # Browser Settings
 BROWSER_HEADLESS = os.getenv('BROWSER_HEADLESS', 'false').lower() == 'true'
 BROWSER_TIMEOUT = int(os.getenv('BROWSER_TIMEOUT', '30'))
+# CDP endpoint of an already running Chrome (e.g. http://localhost:9222) shared by all workers;
+# empty = each worker launches its own Chromium
+BROWSER_CDP_URL = os.getenv('BROWSER_CDP_URL', '')
 
 # Browser launch arguments for optimized experience with zoom
 BROWSER_ARGS = [
     "--start-maximized",          # Start with maximized window  
     "--window-size=1920,1080",    # Set large window size
-    "--disable-web-security",     # Disable web security for better compatibility
     "--disable-features=VizDisplayCompositor",
     "--no-default-browser-check", # Skip default browser check
     "--disable-extensions",       # Disable extensions for better performance
     "--force-device-scale-factor=1.0",  # Ensure consistent scaling
+    "--disable-dev-shm-usage",    # Use /tmp instead of a small /dev/shm for shared memory
+    "--disable-background-timer-throttling",  # Keep timers running when the window is not focused
+    "--disable-renderer-backgrounding",       # Don't deprioritize renderers of background windows
+    "--mute-audio",               # No audio output needed
 ]
 
 # Default viewport settings for full HD experience
@@ -46,7 +56,9 @@ BROWSER_ZOOM_LEVEL = 0.75  # 75% zoom for better image quality
 
 # Advanced Settings
 MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))
+VERBOSE_LOGGING = os.getenv('VERBOSE_LOGGING', 'false').lower() == 'true'  # Per-selector debug output
 MAX_CONCURRENT_JOBS = 3
+HTTP_POOL_SIZE = 32  # Keep-alive connections per host for API/image downloads
 PROMPT_CHUNK_SIZE = 6
 GALLERY_UPDATE_DELAY = 10
 
@@ -65,10 +77,14 @@ ASPECT_RATIOS = {
     "9:16": (936, 1664),
 }
 
+_ASPECT_KEYS = frozenset(ASPECT_RATIOS)
+
+def _normalize_aspect_ratio(ratio_string: str) -> str:
+    """Return the ASPECT_RATIOS key for a ratio string (no allocation when already canonical)"""
+    return ratio_string if ratio_string in _ASPECT_KEYS else ratio_string.upper()
+
+@lru_cache(maxsize=32)
 def get_aspect_ratio_dimensions(ratio_string: str) -> tuple:
     """Get width and height for given aspect ratio string"""
-    ratio_key = ratio_string.upper()
-    if ratio_key in ASPECT_RATIOS:
-        return ASPECT_RATIOS[ratio_key]
-    # Default to 1:1
-    return ASPECT_RATIOS["1:1"]
+    # Single lookup; default to 1:1
+    return ASPECT_RATIOS.get(_normalize_aspect_ratio(ratio_string), ASPECT_RATIOS["1:1"])
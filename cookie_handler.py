@@ -1,15 +1,14 @@
-import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 def load_cookies_from_file(cookie_file_path: str):
     """Load cookies from custom file format (session_id on first line, JSON on remaining lines)"""
     try:
-        with open(cookie_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        session_id = lines[0].strip()
-        json_content = ''.join(lines[1:])
-        cookie_data = json.loads(json_content)
+        with open(cookie_file_path, 'rb') as f:
+            session_id = f.readline().decode('utf-8').strip()
+            # Remaining bytes (after session_id line) are the cookie JSON; orjson parses bytes directly
+            cookie_data = orjson.loads(f.read())
         
         print(f"   📁 Loaded {len(cookie_data)} cookies from {Path(cookie_file_path).name}")
         print(f"   🔑 Session ID: {session_id[:20]}...")
@@ -20,16 +19,17 @@ def load_cookies_from_file(cookie_file_path: str):
         print(f"   ❌ Error loading cookies from {cookie_file_path}: {e}")
         return []
 
+# Valid sameSite values map to themselves; .get(value, "Lax") normalizes in one lookup
+_NORMALIZE_SAME_SITE = {"Strict": "Strict", "Lax": "Lax", "None": "None"}.get
+
 def clean_cookies(cookies):
     """Clean sameSite field from cookies to avoid browser compatibility issues"""
     if not cookies:
         return []
     
-    # Ensure each cookie has a valid sameSite value
-    valid_same_site = {"Strict", "Lax", "None"}
+    # Ensure each cookie has a valid sameSite value (anything else becomes Lax)
     for cookie in cookies:
-        if cookie.get("sameSite") not in valid_same_site:
-            cookie["sameSite"] = "Lax"
+        cookie["sameSite"] = _NORMALIZE_SAME_SITE(cookie.get("sameSite"), "Lax")
     
     print(f"   🧹 Cleaned {len(cookies)} cookies")
     return cookies
@@ -42,19 +42,49 @@ def get_first_cookie_file(cookies_dir: str = "cookies"):
         print(f"❌ Cookies directory '{cookies_dir}' not found")
         return None
     
-    # Find JSON files
-    json_files = list(cookies_path.glob("*.json"))
+    # First JSON file in sorted order, found in a single pass
+    first_file = min(cookies_path.glob("*.json"), default=None)
     
-    if not json_files:
+    if first_file is None:
         print(f"❌ No JSON cookie files found in '{cookies_dir}'")
         return None
     
-    # Sort and take first
-    first_file = sorted(json_files)[0]
     print(f"🍪 Using cookie file: {first_file.name}")
     
     return str(first_file)
 
+def _load_account_file(file_path: Path) -> tuple[dict | None, str]:
+    """
+    Parse one account cookie file
+    
+    Args:
+        file_path: Path to a cookie file (session_id line + cookie JSON)
+    
+    Returns:
+        (account dict or None, status line to print)
+    """
+    try:
+        with file_path.open("rb") as f:
+            session_id = f.readline().decode("utf-8").strip()
+            # Rest of the file is the cookie JSON, kept as bytes for orjson (no str decode)
+            json_content = f.read()
+        
+        if not json_content:
+            return None, f"   ⚠️  {file_path.name}: not enough lines, skipping"
+        
+        cookies = orjson.loads(json_content)
+        
+        account = {
+            "name": file_path.stem,
+            "session_id": session_id,
+            "cookies": cookies,
+            "filepath": file_path,
+        }
+        return account, f"   ✅ Loaded {file_path.name}"
+        
+    except (orjson.JSONDecodeError, UnicodeDecodeError) as exc:
+        return None, f"   ⚠️  {file_path.name}: bad format ({exc})"
+
 def load_accounts(folder: str = "cookies") -> list[dict]:
     """
     Load all cookie files from folder as accounts
@@ -63,7 +93,7 @@ def load_accounts(folder: str = "cookies") -> list[dict]:
         folder: Path to cookies folder
     
     Returns:
-        List of account dicts with 'name', 'session_id', 'cookies', 'filepath'
+        List of account dicts with 'name', 'session_id', 'cookies' (already cleaned), 'filepath'
     """
     print(f"🔑 Loading accounts from '{folder}'...")
     accounts = []
@@ -73,30 +103,15 @@ def load_accounts(folder: str = "cookies") -> list[dict]:
         print(f"❌ Folder not found: {folder}")
         return []
     
-    # Load all JSON files
-    for file_path in sorted(folder_path.glob("*.json")):
-        try:
-            with file_path.open(encoding="utf-8") as f:
-                lines = f.readlines()
-            
-            if len(lines) < 2:
-                print(f"   ⚠️  {file_path.name}: not enough lines, skipping")
-                continue
-            
-            session_id = lines[0].strip()
-            cookies = json.loads("".join(lines[1:]))
-            
-            accounts.append({
-                "name": file_path.stem,
-                "session_id": session_id,
-                "cookies": cookies,
-                "filepath": file_path,
-            })
-            
-            print(f"   ✅ Loaded {file_path.name}")
-            
-        except (json.JSONDecodeError, IndexError) as exc:
-            print(f"   ⚠️  {file_path.name}: bad format ({exc})")
+    # Read and parse files in parallel so disk latency overlaps; map keeps sorted order
+    file_paths = sorted(folder_path.glob("*.json"))
+    with ThreadPoolExecutor(max_workers=min(32, len(file_paths) or 1)) as pool:
+        for account, message in pool.map(_load_account_file, file_paths):
+            print(message)
+            if account is not None:
+                # Clean once here so every later add_cookies() can use the list as-is
+                clean_cookies(account["cookies"])
+                accounts.append(account)
     
     if not accounts:
         print("❌ No usable accounts found")
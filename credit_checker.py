@@ -1,8 +1,103 @@
 from playwright.sync_api import Browser, Page, expect, TimeoutError as PlaywrightTimeoutError
-from cookie_handler import clean_cookies
-from config import DREAMINA_HOME_URL, DREAMINA_CREATIONS_URL, DREAMINA_ROOT_URL, CREDITS_PER_GENERATION, MAX_RETRIES
+from dataclasses import dataclass
+from request_blocking import ANALYTICS_URL_PATTERNS, MEDIA_FONT_URL_PATTERNS, block_heavy_resources, block_urls
+from config import (
+    DREAMINA_HOME_URL, DREAMINA_CREATIONS_URL, DREAMINA_ROOT_URL, CREDITS_PER_GENERATION, MAX_RETRIES
+)
+from retry_utils import backoff
+import re
 import time
 
+_DIGITS_RE = re.compile(r'\d+')
+
+# Where credits can be read: (url, name, per-selector wait in ms), in default order
+_CREDIT_PAGES = (
+    (DREAMINA_HOME_URL, "home", 8000),
+    (DREAMINA_CREATIONS_URL, "creations", 10000),
+)
+
+_CREDIT_SELECTORS = (
+    "div.credit-amount-text-VHUjL3",  # From credit.html
+    "div[class*='credit-amount-text']",  # Class pattern match
+    "#SiderMenuCredit div[class*='credit-amount']",  # By menu ID
+    "div.credit-container-mJtuXc div[class*='credit-amount']",  # Within credit container
+)
+
+# First visible credit element (in selector priority order) whose text holds a number
+_CREDIT_PROBE_JS = """(selectors) => {
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            // getClientRects, not offsetParent: the latter is null inside position:fixed sidebars
+            if (el.getClientRects().length > 0 && /\\d/.test(el.innerText)) {
+                return el.innerText;
+            }
+        }
+    }
+    return null;
+}"""
+
+# Account name -> page URL where its credits were last found (per process)
+_credit_page_hint: dict[str, str] = {}
+
+# Any of these means the app shell has rendered (signed in or not)
+_PAGE_READY_SELECTOR = (
+    "img.dreamina-component-avatar, "
+    "div.dreamina-component-avatar-container, "
+    "div[class*='credit-amount-text'], "
+    "button:has-text('Sign in'), "
+    "button:has-text('Đăng nhập')"
+)
+
+# Login buttons ("Sign in" / "Đăng nhập") mean the cookies are not authenticated,
+# the avatar means they are. Text matching mirrors Playwright's case-insensitive
+# :has-text, which querySelectorAll does not understand.
+_AUTH_PROBE_JS = """() => {
+    const loginTexts = ['sign in', 'đăng nhập'];
+    const login = Array.from(document.querySelectorAll('button, a')).find(
+        el => loginTexts.some(t => (el.textContent || '').toLowerCase().includes(t))
+    );
+    const avatar = document.querySelector(
+        'img.dreamina-component-avatar, div.dreamina-component-avatar-container'
+    );
+    return {login: login ? login.textContent.trim() : null, avatar: avatar !== null};
+}"""
+
+def _probe_credits(page: Page, timeout_ms: int = 10000) -> int | None:
+    """
+    Read the credit count from whichever credit selector shows a number first
+    
+    Args:
+        page: Page that has already navigated to a Dreamina page
+        timeout_ms: How long to poll for a credit element
+    
+    Returns:
+        Credit count, or None if no credit element showed up in time
+    """
+    try:
+        # Polls all credit selectors in the page; returns as soon as any shows a number
+        text = page.wait_for_function(
+            _CREDIT_PROBE_JS, arg=list(_CREDIT_SELECTORS), timeout=timeout_ms
+        ).json_value()
+    except PlaywrightTimeoutError:
+        return None
+    
+    print(f"   📝 Found credit text: {text}")
+    match = _DIGITS_RE.search(text)
+    return int(match.group()) if match else None
+
+def read_page_credits(page: Page, timeout_ms: int = 3000) -> int | None:
+    """
+    Read credits from the page that is already open, without navigating
+    
+    Args:
+        page: Any Dreamina page that shows the credit badge (e.g. the generation page)
+        timeout_ms: How long to wait for the badge to show a number
+    
+    Returns:
+        Credit count, or None if the page does not show it
+    """
+    return _probe_credits(page, timeout_ms)
+
 def safe_navigate_sync(page: Page, target_url: str, max_attempts: int = None):
     """Robust navigation with retries and gateway-timeout detection (sync version)"""
     if max_attempts is None:
@@ -14,16 +109,22 @@ def safe_navigate_sync(page: Page, target_url: str, max_attempts: int = None):
                 print(f"   🔄 Retry attempt {attempt + 1}/{max_attempts}")
                 # First hop to root, then back to target
                 page.goto(DREAMINA_ROOT_URL, wait_until="domcontentloaded", timeout=60000)
-                time.sleep(3)
             
             # Use domcontentloaded for better page load detection
-            page.goto(target_url, wait_until="domcontentloaded", timeout=60000)
+            response = page.goto(target_url, wait_until="domcontentloaded", timeout=60000)
             
-            # Extended wait for page to stabilize
-            time.sleep(3)
+            # Fail fast on gateway errors instead of waiting for a shell that never renders
+            if response is not None and response.status in (502, 503, 504):
+                raise PlaywrightTimeoutError(f"Gateway error {response.status}")
             
-            # Check for gateway timeout in content
-            if "gateway timeout" in page.content().lower():
+            # Wait until the app shell renders instead of sleeping a fixed time
+            try:
+                page.wait_for_selector(_PAGE_READY_SELECTOR, timeout=15000)
+            except PlaywrightTimeoutError:
+                print(f"   ⚠️  Page ready indicator not found, continuing...")
+            
+            # Check for gateway timeout text (has-text is case-insensitive; avoids serializing the DOM)
+            if page.locator('body:has-text("gateway timeout")').count() > 0:
                 raise PlaywrightTimeoutError("Gateway timeout detected in HTML")
             
             return
@@ -33,44 +134,37 @@ def safe_navigate_sync(page: Page, target_url: str, max_attempts: int = None):
             if attempt == max_attempts - 1:
                 print(f"   ❌ All navigation attempts exhausted")
                 raise
-            time.sleep(3)
+            time.sleep(backoff(attempt, base=2.0, cap=30))
 
 def handle_modal_sync(page: Page):
     """Handle modal pop-ups (sync version)"""
-    try:
-        modal_locator = page.locator('div[class*="lv-modal-wrapper"]')
-        modal_locator.first.wait_for(state="visible", timeout=5000)
-        print("   📱 Modal detected, closing...")
-        
-        # Handle multiple modals by closing them one by one
-        modal_count = modal_locator.count()
-        print(f"   📱 Found {modal_count} modal(s)")
-        
-        for i in range(modal_count):
-            try:
-                # Press Escape to close modals
-                page.keyboard.press("Escape")
-                time.sleep(0.5)  # Small delay between key presses
-            except Exception as e:
-                print(f"   ⚠️  Error closing modal {i+1}: {e}")
-        
-        # Wait for all modals to disappear
+    # Only count modals that are actually shown (closed ones may linger hidden in the DOM).
+    # Callers run this once the page has rendered, so one count() replaces waiting 5 s for a
+    # modal that usually never comes.
+    visible_modals = page.locator('div[class*="lv-modal-wrapper"]:visible')
+    modal_count = visible_modals.count()
+    if not modal_count:
+        return
+    
+    print("   📱 Modal detected, closing...")
+    print(f"   📱 Found {modal_count} modal(s)")
+    
+    for i in range(modal_count):
         try:
-            # Wait for the modals to be hidden with a reasonable timeout
-            page.wait_for_function(
-                "() => document.querySelectorAll('div[class*=\"lv-modal-wrapper\"]').length === 0 || "
-                "Array.from(document.querySelectorAll('div[class*=\"lv-modal-wrapper\"]')).every(el => "
-                "getComputedStyle(el).display === 'none' || getComputedStyle(el).visibility === 'hidden')",
-                timeout=5000
-            )
-            print("   ✅ All modals closed")
-        except PlaywrightTimeoutError:
-            print("   ⚠️  Some modals may still be visible")
-        
-        time.sleep(1)
-    except PlaywrightTimeoutError:
-        # No modal, that's fine
-        pass
+            # Press Escape to close the top modal, then wait for it to go away
+            page.keyboard.press("Escape")
+            expect(visible_modals).to_have_count(modal_count - i - 1, timeout=1000)
+        except AssertionError:
+            pass
+        except Exception as e:
+            print(f"   ⚠️  Error closing modal {i+1}: {e}")
+    
+    # Wait for all modals to disappear
+    try:
+        expect(visible_modals).to_have_count(0, timeout=2000)
+        print("   ✅ All modals closed")
+    except AssertionError:
+        print("   ⚠️  Some modals may still be visible")
 
 def check_account_credits(account: dict, browser: Browser = None, existing_context=None) -> int | None:
     """
@@ -104,136 +198,57 @@ def check_account_credits(account: dict, browser: Browser = None, existing_conte
                 locale='en-US',
                 timezone_id='America/New_York'
             )
+            # Only this check uses the context, so skip images/fonts/analytics
+            block_heavy_resources(context)
             
-            # Clean and add cookies
-            cleaned_cookies = clean_cookies(account["cookies"])
-            context.add_cookies(cleaned_cookies)
+            # Cookies were cleaned when the account was loaded
+            context.add_cookies(account["cookies"])
             
             should_close_context = True  # We created it, we close it
         
         page = context.new_page()
+        if existing_context:
+            # The caller's context does not route requests, so block per page
+            block_urls(page, MEDIA_FONT_URL_PATTERNS + ANALYTICS_URL_PATTERNS)
         
-        # Navigate to home page with retries
-        print(f"   🌐 Navigating to home page...")
-        safe_navigate_sync(page, DREAMINA_HOME_URL)
-        
-        # Brief wait for page UI to load
-        print(f"   ⏳ Waiting for page UI to load...")
-        time.sleep(1.5)
-        
-        # Check and close any modal
-        handle_modal_sync(page)
-        
-        # First, check if there's a Sign in / Login button (means not authenticated)
-        print(f"   🔍 Verifying authentication...")
-        
-        # Check for login/sign-in buttons
-        login_button_selectors = [
-            'button:has-text("Sign in")',
-            'button:has-text("sign in")',
-            'button:has-text("Đăng nhập")',
-            'button:has-text("đăng nhập")',
-            'a:has-text("Sign in")',
-            'a:has-text("sign in")',
-            'a:has-text("Đăng nhập")',
-            'a:has-text("đăng nhập")',
-        ]
-        
-        for selector in login_button_selectors:
-            try:
-                print(f"   🔍 Checking for login indicator: {selector}")
-                element = page.locator(selector)
-                if element.count() > 0:
-                    print(f"   ❌ Not authenticated - found login button: {selector}")
-                    return None
-            except:
-                continue
-        
-        # Then verify authentication by checking for user avatar/profile
-        auth_indicators = [
-            'img.dreamina-component-avatar',
-            'div.dreamina-component-avatar-container',
-        ]
-        
-        auth_found = False
-        for selector in auth_indicators:
-            try:
-                print(f"   🔍 Looking for auth indicator: {selector}")
-                element = page.locator(selector)
-                if element.count() > 0:
-                    print(f"   ✅ Authenticated (found: {selector})")
-                    auth_found = True
-                    break
-            except:
-                continue
-        
-        if not auth_found:
-            print(f"   ❌ Not authenticated - cookies may be invalid")
-            return None
-        
-        # Try to find credits on current page first (home page may have it)
-        print(f"   🔍 Looking for credit display on home page...")
-        credit_selectors = [
-            "div.credit-amount-text-VHUjL3",  # From credit.html
-            "div[class*='credit-amount-text']",  # Class pattern match
-            "#SiderMenuCredit div[class*='credit-amount']",  # By menu ID
-            "div.credit-container-mJtuXc div[class*='credit-amount']",  # Within credit container
-        ]
+        # Try the page where this account's credits were last found first
+        credit_pages = _CREDIT_PAGES
+        if _credit_page_hint.get(account["name"]) == DREAMINA_CREATIONS_URL:
+            credit_pages = credit_pages[::-1]
         
         credits = None
-        for selector in credit_selectors:
-            try:
-                print(f"   🔍 Checking credit selector: {selector}")
-                credit_element = page.locator(selector).first
-                # Extended wait for credit elements
-                credit_element.wait_for(state="visible", timeout=8000)
-                
-                # Try to extract number from text
-                text = credit_element.inner_text()
-                print(f"   📝 Found text with {selector}: {text}")
-                
-                # Extract number from text
-                import re
-                numbers = re.findall(r'\d+', text)
-                if numbers:
-                    credits = int(numbers[0])
-                    print(f"   ✅ Credits: {credits}")
-                    break
-            except Exception as e:
-                print(f"   ⏳ Selector {selector} not found, trying next...")
-                continue
-        
-        # If not found on home, try creations page
-        if credits is None:
-            print(f"   🌐 Navigating to creations page...")
-            safe_navigate_sync(page, DREAMINA_CREATIONS_URL)
+        for page_index, (page_url, page_name, credit_timeout) in enumerate(credit_pages):
+            # Navigate with retries (returns once the avatar / Sign in / credit has rendered)
+            print(f"   🌐 Navigating to {page_name} page...")
+            safe_navigate_sync(page, page_url)
             
-            # Brief wait for creations page
-            print(f"   ⏳ Waiting for creations page to load...")
-            time.sleep(1.5)
-            
-            # Check and close any modal again
+            # Check and close any modal
             handle_modal_sync(page)
             
-            for selector in credit_selectors:
-                try:
-                    print(f"   🔍 Checking credit on creations: {selector}")
-                    credit_element = page.locator(selector).first
-                    # Extended wait for credit elements on creations page
-                    credit_element.wait_for(state="visible", timeout=10000)
-                    
-                    text = credit_element.inner_text()
-                    print(f"   📝 Found text with {selector}: {text}")
-                    
-                    import re
-                    numbers = re.findall(r'\d+', text)
-                    if numbers:
-                        credits = int(numbers[0])
-                        print(f"   ✅ Credits: {credits}")
-                        break
-                except Exception as e:
-                    print(f"   ⏳ Selector {selector} not found on creations...")
-                    continue
+            if page_index == 0:
+                # First, check if there's a Sign in / Login button (means not authenticated)
+                print(f"   🔍 Verifying authentication...")
+                
+                # Check for login buttons and the user avatar in a single round-trip
+                auth_state = page.evaluate(_AUTH_PROBE_JS)
+                
+                if auth_state["login"]:
+                    print(f"   ❌ Not authenticated - found login button: {auth_state['login']}")
+                    return None
+                
+                if not auth_state["avatar"]:
+                    print(f"   ❌ Not authenticated - cookies may be invalid")
+                    return None
+                
+                print(f"   ✅ Authenticated (found user avatar)")
+            
+            print(f"   🔍 Looking for credit display on {page_name} page...")
+            credits = _probe_credits(page, credit_timeout)
+            if credits is not None:
+                print(f"   ✅ Credits: {credits}")
+                _credit_page_hint[account["name"]] = page_url
+                break
+            print(f"   ⏳ Credit display not found on {page_name}...")
         
         if credits is None:
             print(f"   ❌ Could not find credit display")
@@ -251,21 +266,26 @@ def check_account_credits(account: dict, browser: Browser = None, existing_conte
         if page:
             try:
                 page.close()
-            except:
+            except Exception:
                 pass
         
         # Only close context if we created it
         if context and should_close_context:
             try:
                 context.close()
-            except:
+            except Exception:
                 pass
-            # Small delay to ensure complete cleanup
-            time.sleep(0.5)
 
-def has_enough_credits(account: dict, browser: Browser, required: int = None) -> bool:
+@dataclass
+class CreditStatus:
+    """Result of a single credit check"""
+    credits: int | None
+    enough: bool
+    max_generations: int
+
+def get_credit_status(account: dict, browser: Browser, required: int = None) -> CreditStatus:
     """
-    Check if account has enough credits for generation
+    Check credits once and derive everything callers need from that number
     
     Args:
         account: Account dict
@@ -273,7 +293,7 @@ def has_enough_credits(account: dict, browser: Browser, required: int = None) ->
         required: Required credits (default: CREDITS_PER_GENERATION)
     
     Returns:
-        True if has enough credits
+        CreditStatus with raw credits, whether they cover `required`, and max generations
     """
     if required is None:
         required = CREDITS_PER_GENERATION
@@ -281,9 +301,27 @@ def has_enough_credits(account: dict, browser: Browser, required: int = None) ->
     credits = check_account_credits(account, browser)
     
     if credits is None:
-        return False
+        return CreditStatus(credits=None, enough=False, max_generations=0)
     
-    return credits >= required
+    return CreditStatus(
+        credits=credits,
+        enough=credits >= required,
+        max_generations=credits // CREDITS_PER_GENERATION
+    )
+
+def has_enough_credits(account: dict, browser: Browser, required: int = None) -> bool:
+    """
+    Check if account has enough credits for generation
+    
+    Args:
+        account: Account dict
+        browser: Playwright browser instance
+        required: Required credits (default: CREDITS_PER_GENERATION)
+    
+    Returns:
+        True if has enough credits
+    """
+    return get_credit_status(account, browser, required).enough
 
 def get_max_generations(account: dict, browser: Browser) -> int:
     """
@@ -296,9 +334,4 @@ def get_max_generations(account: dict, browser: Browser) -> int:
     Returns:
         Number of generations possible
     """
-    credits = check_account_credits(account, browser)
-    
-    if credits is None:
-        return 0
-    
-    return credits // CREDITS_PER_GENERATION
+    return get_credit_status(account, browser).max_generations
@@ -6,6 +6,7 @@ Import this at the beginning of any Python script to fix encoding issues
 """
 
 import os
+import re
 import sys
 
 # SAVE ORIGINAL PRINT FIRST, BEFORE ANY OVERRIDES
@@ -16,6 +17,11 @@ def apply_universal_encoding_fix():
     """
     Triệt để fix encoding issues cho tất cả platforms
     """
+    # Fast path: non-Windows console that already speaks UTF-8 needs none of the steps below
+    encoding = (getattr(sys.stdout, 'encoding', '') or '').lower().replace('-', '')
+    if encoding == 'utf8' and not sys.platform.startswith('win'):
+        return True
+    
     try:
         # 1. Environment variables - tất cả encoding-related
         encoding_vars = {
@@ -32,14 +38,17 @@ def apply_universal_encoding_fix():
         # 2. Windows specific - chcp + console encoding
         if sys.platform.startswith('win'):
             try:
-                # Set console code page to UTF-8
-                os.system('chcp 65001 >nul 2>&1')
-                
-                # Try to set console output to UTF-8
                 import ctypes
                 kernel32 = ctypes.windll.kernel32
-                kernel32.SetConsoleOutputCP(65001)
-                kernel32.SetConsoleCP(65001)
+                
+                # Only spawn chcp if the console is not on UTF-8 already
+                if kernel32.GetConsoleOutputCP() != 65001:
+                    # Set console code page to UTF-8
+                    os.system('chcp 65001 >nul 2>&1')
+                    
+                    # Try to set console output to UTF-8
+                    kernel32.SetConsoleOutputCP(65001)
+                    kernel32.SetConsoleCP(65001)
             except:
                 pass
         
@@ -82,6 +91,21 @@ def apply_universal_encoding_fix():
 # Apply immediately when imported
 apply_universal_encoding_fix()
 
+# Emoji replacements for consoles that cannot encode them
+_EMOJI_MAP = {
+    '🚀': '[START]', '✅': '[OK]', '❌': '[ERROR]', '⚠️': '[WARNING]',
+    '📝': '[NOTE]', '🔍': '[SEARCH]', '💰': '[CREDITS]', '🎨': '[GENERATE]',
+    '📐': '[RATIO]', '🖼️': '[IMAGE]', '📁': '[FOLDER]', '⏳': '[WAIT]',
+    '🌐': '[WEB]', '🔥': '[FIRE]', '🎯': '[TARGET]', '🤔': '[THINK]',
+    '🎉': '[PARTY]', '🔧': '[TOOL]', '🐍': '[PYTHON]', '💾': '[SAVE]',
+    '📊': '[CHART]', '🔄': '[RELOAD]', '📋': '[COPY]', '⭐': '[STAR]'
+}
+# Longest first so multi-codepoint emoji (e.g. '⚠️') win over their base character
+_EMOJI_RE = re.compile("|".join(re.escape(k) for k in sorted(_EMOJI_MAP, key=len, reverse=True)))
+
+def _replace_emoji(match):
+    return _EMOJI_MAP[match.group(0)]
+
 def safe_print(*args, **kwargs):
     """
     Universal safe print function - ALWAYS use original print to avoid recursion
@@ -89,23 +113,11 @@ def safe_print(*args, **kwargs):
     try:
         _ORIGINAL_PRINT(*args, **kwargs)  # Use saved original print
     except (UnicodeEncodeError, UnicodeDecodeError):
-        # Emoji replacements
-        emoji_map = {
-            '🚀': '[START]', '✅': '[OK]', '❌': '[ERROR]', '⚠️': '[WARNING]',
-            '📝': '[NOTE]', '🔍': '[SEARCH]', '💰': '[CREDITS]', '🎨': '[GENERATE]',
-            '📐': '[RATIO]', '🖼️': '[IMAGE]', '📁': '[FOLDER]', '⏳': '[WAIT]',
-            '🌐': '[WEB]', '🔥': '[FIRE]', '🎯': '[TARGET]', '🤔': '[THINK]',
-            '🎉': '[PARTY]', '🔧': '[TOOL]', '🐍': '[PYTHON]', '💾': '[SAVE]',
-            '📊': '[CHART]', '🔄': '[RELOAD]', '📋': '[COPY]', '⭐': '[STAR]'
-        }
-        
         safe_args = []
         for arg in args:
             if isinstance(arg, str):
-                safe_arg = arg
-                for emoji, replacement in emoji_map.items():
-                    safe_arg = safe_arg.replace(emoji, replacement)
-                safe_args.append(safe_arg)
+                # Single pass over the string for all emoji
+                safe_args.append(_EMOJI_RE.sub(_replace_emoji, arg))
             else:
                 try:
                     safe_args.append(str(arg))
@@ -10,6 +10,8 @@ import builtins
 builtins.print = safe_print
 
 import os
+import re
+import signal
 import sys
 import subprocess
 import threading
@@ -18,62 +20,130 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from datetime import datetime
-import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Lines kept per instance between UI ticks; older lines are dropped if main.py outruns the GUI
+LOG_BUFFER_SIZE = 10_000
+
+# The log widget is trimmed by LOG_TRIM_LINES once it holds more than LOG_MAX_LINES
+LOG_MAX_LINES = 10_000
+LOG_TRIM_LINES = 1_000
+
+# UI refresh interval while workers run or logs arrive, and while everything is idle
+UI_POLL_ACTIVE_MS = 200
+UI_POLL_IDLE_MS = 2000
+
+# Above this many lines per instance per tick, log lines are shown without timestamps
+LOG_BULK_LINES = 500
+
+# Config values used as numbers by the launcher itself; the rest stay strings for the worker env
+_CONFIG_TYPES = {
+    'INSTANCES': int,
+    'STARTUP_DELAY': int
+}
+
+_STATUS_EMOJI = {
+    "stopped": "⚪",
+    "running": "🟢",
+    "completed": "✅",
+    "failed": "❌"
+}
+
+# KEY=value lines of a .env file; comments, blank lines and lines without '=' are skipped
+_ENV_LINE_RE = re.compile(rb'^[ \t]*([^#=\s][^=\n]*?)[ \t]*=[ \t]*(.*?)[ \t\r]*$', re.M)
+
+def parse_aspect_ratios(config):
+    """Tách ASPECT_RATIO (vd: "16:9, 1:1") thành danh sách ratio"""
+    return [ratio.strip() for ratio in config.get('ASPECT_RATIO', '16:9').split(',')]
+
 
 class InstanceController:
     """Controller cho một instance của main.py"""
-    def __init__(self, instance_id, config, workspace, python_cmd):
+    def __init__(self, instance_id, config, workspace, python_cmd, base_env=None, io_pool=None,
+                 aspect_ratios=None):
         self.instance_id = instance_id
         self.config = config
         self.workspace = workspace
         self.python_cmd = python_cmd
+        # Exit waiters run on a pool shared by all instances (one slot per instance); pipe readers
+        # get their own threads since an orphaned grandchild can keep a pipe open indefinitely
+        self.io_pool = io_pool or ThreadPoolExecutor(max_workers=1, thread_name_prefix='dreamina-io')
         self.process = None
         self.status = "stopped"  # stopped, running, completed, failed
-        self.log_queue = queue.Queue()
+        self.log_buffer = deque(maxlen=LOG_BUFFER_SIZE)
+        self.log_lock = threading.Lock()
         self.start_time = None
         self.end_time = None
+        self._start_monotonic = None  # Runtime is measured on the monotonic clock
+        self._end_monotonic = None
+        self._stopping = False  # Set by stop() so the reader does not report the kill as a failure
+        # Merge stderr into stdout: one pipe and one reader thread per worker (MERGE_STDERR=false to split)
+        self.merge_stderr = str(config.get('MERGE_STDERR', 'true')).lower() == 'true'
+        
+        # Aspect ratios are assigned round-robin across workers
+        if aspect_ratios is None:
+            aspect_ratios = parse_aspect_ratios(config)
+        self.worker_aspect_ratio = aspect_ratios[(instance_id - 1) % len(aspect_ratios)]
+        
+        # Config does not change after load, so the env and its summary are built once
+        self._overrides = self._compute_overrides()
+        self._env = {**(os.environ if base_env is None else base_env), **self._overrides}
+        self.config_str = (f"📁 {self._env['COOKIES_FOLDER']} | "
+                           f"📝 {self._env['PROMPT_FILE']} | "
+                           f"📐 {self._env['ASPECT_RATIO']} | "
+                           f"💾 {self._env['OUTPUT_DIR']}")
         
     def get_env(self):
         """Lấy environment variables cho instance này"""
+        return self._env
+    
+    def _compute_overrides(self):
+        """Tạo các biến environment riêng của instance này"""
         cookies_base = self.config.get('COOKIES_BASE', 'cookies')
         outputs_base = self.config.get('OUTPUTS_BASE', 'outputs')
         
-        # Parse aspect ratios
-        aspect_ratios_str = self.config.get('ASPECT_RATIO', '16:9')
-        aspect_ratios = [ratio.strip() for ratio in aspect_ratios_str.split(',')]
-        
-        # Get aspect ratio for this worker
-        ratio_index = (self.instance_id - 1) % len(aspect_ratios)
-        worker_aspect_ratio = aspect_ratios[ratio_index]
-        
-        env = os.environ.copy()
-        env.update({
+        return {
             'COOKIES_FOLDER': f"{cookies_base}{self.instance_id}",
             'PROMPT_FILE': f"prompts/{self.instance_id}.txt",
             'OUTPUT_DIR': f"{outputs_base}{self.instance_id}",
-            'ASPECT_RATIO': worker_aspect_ratio,
+            'ASPECT_RATIO': self.worker_aspect_ratio,
             'IMAGE_COUNT': self.config.get('IMAGE_COUNT', '4'),
             'BROWSER_HEADLESS': self.config.get('BROWSER_HEADLESS', 'false')
-        })
-        
-        if sys.platform.startswith('win'):
-            env.update({
-                'PYTHONIOENCODING': 'utf-8',
-                'PYTHONLEGACYWINDOWSSTDIO': '1'
-            })
-        
-        return env
+        }
+    
+    def push_log(self, stream_type, timestamp, message):
+        """Thêm một dòng log vào buffer (gọi từ bất kỳ thread nào)"""
+        with self.log_lock:
+            self.log_buffer.append((stream_type, timestamp, message))
+    
+    def drain_logs(self):
+        """Lấy và xóa toàn bộ log đang chờ"""
+        with self.log_lock:
+            items = list(self.log_buffer)
+            self.log_buffer.clear()
+        return items
     
     def stream_output(self, pipe, stream_type):
         """Stream output từ subprocess"""
         try:
-            for line in iter(pipe.readline, ''):
-                if line:
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    self.log_queue.put((stream_type, timestamp, line.rstrip()))
+            # Read whatever is available (up to 64 KiB) and split lines here,
+            # instead of a readline per line on a line-buffered text pipe
+            buf = b""
+            while True:
+                chunk = pipe.read1(65536)
+                if not chunk:
+                    break
+                *lines, buf = (buf + chunk).split(b"\n")
+                timestamp = time.time()  # Formatted by the UI only if the line is shown
+                for line in lines:
+                    self.push_log(stream_type, timestamp, line.decode('utf-8', 'replace').rstrip())
+            
+            if buf:
+                self.push_log(stream_type, time.time(), buf.decode('utf-8', 'replace').rstrip())
             pipe.close()
         except Exception as e:
-            self.log_queue.put(("error", "", f"Stream error: {e}"))
+            self.push_log("error", "", f"Stream error: {e}")
     
     def start(self):
         """Bắt đầu chạy instance"""
@@ -83,91 +153,105 @@ class InstanceController:
         self.status = "running"
         self.start_time = datetime.now()
         self.end_time = None
+        self._start_monotonic = time.monotonic()
+        self._end_monotonic = None
+        self._stopping = False
         
         env = self.get_env()
         
         try:
-            encoding = 'utf-8' if sys.platform.startswith('win') else None
-            
+            # Binary, fully buffered pipes; stream_output decodes lines as UTF-8
             self.process = subprocess.Popen(
                 [self.python_cmd, 'main.py'],
                 cwd=self.workspace,
                 env=env,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding=encoding,
-                errors='replace',
-                bufsize=1
+                stderr=subprocess.STDOUT if self.merge_stderr else subprocess.PIPE,
+                bufsize=-1,
+                # Own process group on Windows so stop() can send CTRL_BREAK to this worker only
+                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform.startswith('win') else 0
             )
             
-            # Start output streaming threads
-            threading.Thread(
-                target=self.stream_output,
-                args=(self.process.stdout, "stdout"),
-                daemon=True
-            ).start()
-            
-            threading.Thread(
-                target=self.stream_output,
-                args=(self.process.stderr, "stderr"),
-                daemon=True
-            ).start()
-            
-            # Start monitoring thread
-            threading.Thread(
-                target=self._monitor_process,
-                daemon=True
-            ).start()
+            # Output is streamed and the exit awaited separately: a grandchild (Playwright driver,
+            # browser) that inherits the pipes must not keep the instance "running" after exit
+            proc = self.process
+            readers = [self._start_reader(proc.stdout, "stdout")]
+            if proc.stderr is not None:
+                # Windows pipes cannot be select()-ed, so a separate stderr pipe needs its own thread
+                readers.append(self._start_reader(proc.stderr, "stderr"))
+            self.io_pool.submit(self._wait_for_exit, proc, readers)
             
             return True
             
         except Exception as e:
             self.status = "failed"
-            self.log_queue.put(("error", "", f"Failed to start: {e}"))
+            self.push_log("error", "", f"Failed to start: {e}")
             return False
     
-    def _monitor_process(self):
-        """Monitor process và cập nhật status"""
-        if self.process:
-            returncode = self.process.wait()
-            self.end_time = datetime.now()
-            
-            if returncode == 0:
-                self.status = "completed"
-                self.log_queue.put(("info", "", "✅ Completed successfully"))
-            else:
-                self.status = "failed"
-                self.log_queue.put(("error", "", f"❌ Failed with code: {returncode}"))
+    def _start_reader(self, pipe, stream_type):
+        """Đọc một pipe trên thread riêng (không chiếm slot của io_pool)"""
+        thread = threading.Thread(target=self.stream_output, args=(pipe, stream_type), daemon=True)
+        thread.start()
+        return thread
+    
+    def _wait_for_exit(self, proc, readers):
+        """Chờ process kết thúc rồi cập nhật status"""
+        returncode = proc.wait()
+        # Give the readers a moment to flush the last lines before the status message;
+        # bounded, since inherited pipes may never reach EOF
+        for reader in readers:
+            reader.join(timeout=2)
+        if proc is not self.process or self._stopping:
+            return  # Restarted since (stale waiter), or stop() records the final status
+        self.mark_ended()
+        
+        if returncode == 0:
+            self.status = "completed"
+            self.push_log("info", "", "✅ Completed successfully")
+        else:
+            self.status = "failed"
+            self.push_log("error", "", f"❌ Failed with code: {returncode}")
     
     def stop(self):
         """Dừng instance"""
         if self.process and self.status == "running":
+            self._stopping = True
             try:
-                self.process.terminate()
+                if sys.platform.startswith('win'):
+                    # Lets main.py unwind and close its browser; TerminateProcess would not
+                    self.process.send_signal(signal.CTRL_BREAK_EVENT)
+                else:
+                    self.process.terminate()
                 self.process.wait(timeout=5)
                 self.status = "stopped"
-                self.end_time = datetime.now()
-                self.log_queue.put(("info", "", "⏹️ Stopped by user"))
+                self.mark_ended()
+                self.push_log("info", "", "⏹️ Stopped by user")
                 return True
             except:
                 try:
                     self.process.kill()
                     self.process.wait()
                     self.status = "stopped"
-                    self.end_time = datetime.now()
+                    self.mark_ended()
                     return True
                 except:
                     return False
         return False
     
+    def mark_ended(self):
+        """Ghi lại thời điểm instance kết thúc"""
+        self.end_time = datetime.now()
+        self._end_monotonic = time.monotonic()
+    
     def get_runtime(self):
         """Lấy thời gian chạy"""
-        if self.start_time:
-            end = self.end_time or datetime.now()
-            delta = end - self.start_time
-            return str(delta).split('.')[0]  # Format: HH:MM:SS
-        return "00:00:00"
+        if self._start_monotonic is None:
+            return "00:00:00"
+        
+        seconds = int((self._end_monotonic or time.monotonic()) - self._start_monotonic)
+        hours, rest = divmod(seconds, 3600)
+        minutes, seconds = divmod(rest, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 
 class LauncherGUI:
@@ -180,9 +264,14 @@ class LauncherGUI:
         self.workspace = Path(__file__).parent
         self.env_file = self.workspace / ".env"
         self.python_cmd = self.detect_python_command()
+        self.base_env = self.build_base_env()
         self.config = self.load_config()
         self.instances = []
         self.update_timer = None
+        self._row_iids = {}  # instance_id -> treeview item id
+        self._row_cache = {}  # instance_id -> (status, runtime) last shown
+        self._last_status_text = None
+        self._stop_all_event = threading.Event()  # Set by Stop All to cancel a pending start_all
         
         self.setup_ui()
         self.load_instances()
@@ -193,6 +282,20 @@ class LauncherGUI:
         import platform
         import shutil
         
+        # The launcher's own interpreter can run main.py; only probe PATH when asked to
+        if sys.executable and not os.environ.get('DREAMINA_FORCE_DETECT'):
+            return sys.executable
+        
+        # Reuse the command detected last time on this platform
+        cache_file = self.workspace / ".python_cmd_cache"
+        platform_key = platform.platform()
+        try:
+            cached_key, cached_cmd = cache_file.read_text(encoding='utf-8').split('\n', 1)
+            if cached_key == platform_key and shutil.which(cached_cmd):
+                return cached_cmd
+        except (OSError, ValueError):
+            pass
+        
         if platform.system() == "Windows":
             commands = ['python', 'py', 'python3']
         else:
@@ -204,12 +307,28 @@ class LauncherGUI:
                     result = subprocess.run([cmd, '--version'], 
                                           capture_output=True, text=True, timeout=5)
                     if result.returncode == 0 and 'Python' in result.stdout:
+                        try:
+                            cache_file.write_text(f"{platform_key}\n{cmd}", encoding='utf-8')
+                        except OSError:
+                            pass
                         return cmd
                 except:
                     continue
         
         return sys.executable
     
+    def build_base_env(self):
+        """Environment chung cho mọi instance (copy os.environ một lần)"""
+        env = os.environ.copy()
+        
+        if sys.platform.startswith('win'):
+            env.update({
+                'PYTHONIOENCODING': 'utf-8',
+                'PYTHONLEGACYWINDOWSSTDIO': '1'
+            })
+        
+        return env
+    
     def load_config(self):
         """Load config từ .env"""
         config = {}
@@ -218,13 +337,13 @@ class LauncherGUI:
             messagebox.showerror("Error", "File .env không tồn tại!\nVui lòng tạo file .env trước.")
             return config
         
-        with open(self.env_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        config[key.strip()] = value.strip()
+        data = self.env_file.read_bytes()
+        for key, value in _ENV_LINE_RE.findall(data):
+            config[key.decode('utf-8')] = value.decode('utf-8')
+        
+        for key, convert in _CONFIG_TYPES.items():
+            if key in config:
+                config[key] = convert(config[key])
         
         return config
     
@@ -296,42 +415,47 @@ class LauncherGUI:
     
     def load_instances(self):
         """Load instances từ config"""
-        instances_count = int(self.config.get('INSTANCES', 3))
+        instances_count = self.config.get('INSTANCES', 3)
+        
+        # One exit waiter per instance, reused across restarts (readers use their own threads)
+        self.io_pool = ThreadPoolExecutor(max_workers=instances_count, thread_name_prefix='dreamina-io')
+        
+        aspect_ratios = parse_aspect_ratios(self.config)
         
         for i in range(1, instances_count + 1):
-            instance = InstanceController(i, self.config, self.workspace, self.python_cmd)
+            instance = InstanceController(i, self.config, self.workspace, self.python_cmd,
+                                          self.base_env, self.io_pool, aspect_ratios)
             self.instances.append(instance)
         
         self.refresh_ui()
     
     def refresh_ui(self):
         """Cập nhật UI với trạng thái hiện tại"""
-        # Clear treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Add instances
+        # Update rows in place, and only those whose status or runtime changed
         for instance in self.instances:
-            status_emoji = {
-                "stopped": "⚪",
-                "running": "🟢",
-                "completed": "✅",
-                "failed": "❌"
-            }.get(instance.status, "⚪")
+            runtime = instance.get_runtime()
+            key = (instance.status, runtime)
+            if self._row_cache.get(instance.instance_id) == key:
+                continue
+            self._row_cache[instance.instance_id] = key
             
-            env = instance.get_env()
-            config_str = (f"📁 {env['COOKIES_FOLDER']} | "
-                         f"📝 {env['PROMPT_FILE']} | "
-                         f"📐 {env['ASPECT_RATIO']} | "
-                         f"💾 {env['OUTPUT_DIR']}")
+            status_emoji = _STATUS_EMOJI.get(instance.status, "⚪")
             
-            self.tree.insert("", tk.END, values=(
+            values = (
                 f"Worker {instance.instance_id}",
                 f"{status_emoji} {instance.status.title()}",
-                instance.get_runtime(),
-                config_str,
+                runtime,
+                instance.config_str,
                 ""
-            ), tags=(instance.instance_id,))
+            )
+            
+            iid = self._row_iids.get(instance.instance_id)
+            if iid is None:
+                self._row_iids[instance.instance_id] = self.tree.insert(
+                    "", tk.END, values=values, tags=(instance.instance_id,)
+                )
+            else:
+                self.tree.item(iid, values=values)
         
         # Update status label
         running_count = sum(1 for i in self.instances if i.status == "running")
@@ -339,7 +463,9 @@ class LauncherGUI:
         failed_count = sum(1 for i in self.instances if i.status == "failed")
         
         status_text = f"Running: {running_count} | Completed: {completed_count} | Failed: {failed_count}"
-        self.status_label.config(text=status_text)
+        if status_text != self._last_status_text:
+            self._last_status_text = status_text
+            self.status_label.config(text=status_text)
     
     def on_instance_double_click(self, event):
         """Double click để start/stop instance"""
@@ -410,7 +536,8 @@ class LauncherGUI:
         if not messagebox.askyesno("Confirm", "Start all instances?"):
             return
         
-        startup_delay = int(self.config.get('STARTUP_DELAY', 5))
+        startup_delay = self.config.get('STARTUP_DELAY', 5)
+        self._stop_all_event.clear()
         
         def start_all_thread():
             for i, instance in enumerate(self.instances, 1):
@@ -419,7 +546,9 @@ class LauncherGUI:
                     
                     if i < len(self.instances):
                         self.log(f"⏰ Waiting {startup_delay}s before next instance...", "info")
-                        time.sleep(startup_delay)
+                        # Returns early (True) when Stop All is pressed during the delay
+                        if self._stop_all_event.wait(startup_delay):
+                            return
         
         threading.Thread(target=start_all_thread, daemon=True).start()
     
@@ -429,6 +558,7 @@ class LauncherGUI:
             return
         
         self.log("⏹️ Stopping all instances...", "info")
+        self._stop_all_event.set()
         
         for i, instance in enumerate(self.instances, 1):
             if instance.status == "running":
@@ -477,28 +607,43 @@ Times:
     
     def update_ui(self):
         """Cập nhật UI định kỳ"""
-        # Process log queues
+        # Process log buffers: drain every buffer, then insert all lines in one Tk call
+        chunks = []
         for instance in self.instances:
-            try:
-                while True:
-                    stream_type, timestamp, message = instance.log_queue.get_nowait()
-                    
-                    if timestamp:
-                        self.log_text.insert(tk.END, f"[{timestamp}] ", "timestamp")
-                    
-                    prefix = f"[Worker {instance.instance_id}] "
-                    self.log_text.insert(tk.END, prefix, "info")
-                    self.log_text.insert(tk.END, f"{message}\n", stream_type)
-                    self.log_text.see(tk.END)
-                    
-            except queue.Empty:
-                break
+            items = instance.drain_logs()
+            if not items:
+                continue
+            
+            # Text.insert takes alternating (chars, tags) pairs, so one call keeps line order and colors
+            prefix = f"[Worker {instance.instance_id}] "
+            show_time = len(items) <= LOG_BULK_LINES
+            last_ts = last_stamp = None
+            for stream_type, timestamp, message in items:
+                if timestamp and show_time:
+                    # Lines read in the same chunk share a timestamp, so format each value once
+                    if timestamp != last_ts:
+                        last_ts = timestamp
+                        last_stamp = f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] "
+                    chunks += (last_stamp, "timestamp")
+                chunks += (prefix, "info", f"{message}\n", stream_type)
+        
+        if chunks:
+            self.log_text.insert(tk.END, *chunks)
+            
+            # Keep the widget bounded so long runs do not slow Tk down
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + LOG_TRIM_LINES}.0")
+            
+            self.log_text.see(tk.END)
         
         # Refresh tree
         self.refresh_ui()
         
-        # Schedule next update
-        self.update_timer = self.root.after(1000, self.update_ui)
+        # Schedule next update: poll fast while there is work, slowly when idle
+        active = bool(chunks) or any(i.status == "running" for i in self.instances)
+        delay = UI_POLL_ACTIVE_MS if active else UI_POLL_IDLE_MS
+        self.update_timer = self.root.after(delay, self.update_ui)
     
     def on_closing(self):
         """Handle window closing"""
@@ -509,7 +654,8 @@ Times:
                                       f"{running_count} instances are still running.\nStop them and exit?"):
                 return
         
-        # Stop all instances
+        # Stop all instances (and any start_all still waiting to launch more)
+        self._stop_all_event.set()
         for instance in self.instances:
             if instance.status == "running":
                 instance.stop()
@@ -518,6 +664,8 @@ Times:
         if self.update_timer:
             self.root.after_cancel(self.update_timer)
         
+        self.io_pool.shutdown(wait=False, cancel_futures=True)
+        
         self.root.destroy()
 
 
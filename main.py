@@ -7,59 +7,107 @@ Dreamina Multi-Account Image Generator (UI-based)
 - Automatically switches accounts when credits run out
 """
 
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-Dreamina Multi-Account Image Generator (UI-based)
-- Loads prompts from file
-- Generates images via UI interaction with Playwright
-- Automatically switches accounts when credits run out
-"""
-
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-Dreamina Multi-Account Image Generator (UI-based)
-- Loads prompts from file
-- Generates images via UI interaction with Playwright
-- Automatically switches accounts when credits run out
-"""
-
 # IMPORT ENCODING FIX TRƯỚC TIÊN - TRIỆT ĐỂ FIX
 from encoding_fix import safe_print
 import builtins
 builtins.print = safe_print  # Override print globally
 
-import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-from dotenv import load_dotenv
+import signal
+import sys
 import time
 
 # Import our modules
 from config import (
-    COOKIES_FOLDER, PROMPT_FILE, IMAGE_COUNT, CREDITS_PER_GENERATION,
-    BROWSER_HEADLESS, TARGET_URL, BROWSER_ARGS, BROWSER_VIEWPORT, BROWSER_ZOOM_LEVEL
+    COOKIES_FOLDER, PROMPT_FILE, IMAGE_COUNT, CREDITS_PER_GENERATION, CREDIT_RECHECK_INTERVAL,
+    BROWSER_HEADLESS, TARGET_URL, BROWSER_ARGS, BROWSER_VIEWPORT, BROWSER_ZOOM_LEVEL, ASPECT_RATIO,
+    BROWSER_CDP_URL, DREAMINA_ROOT_URL
 )
-from cookie_handler import load_accounts, clean_cookies
+from cookie_handler import load_accounts
 from prompt_loader import load_prompts_from_file
-from credit_checker import check_account_credits
-from ui_generator import generate_image_via_ui
+from request_blocking import ANALYTICS_URL_PATTERNS, MEDIA_FONT_URL_PATTERNS, block_urls
+from credit_checker import check_account_credits, handle_modal_sync, read_page_credits
+from ui_generator import browser_http_client, generate_image_via_ui
+
+# Prompt textarea of the generation page; once it renders the UI is usable
+_PROMPT_BOX_SELECTOR = 'textarea[placeholder*="prompt"], textarea[placeholder*="Prompt"], textarea[placeholder*="描述"]'
+
+def _wait_for_prompt_box(page, timeout: int = 10000) -> bool:
+    """Wait until the prompt textarea is visible instead of sleeping a fixed time"""
+    try:
+        page.wait_for_selector(_PROMPT_BOX_SELECTOR, state="visible", timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        print("   ⚠️  Prompt box not visible yet, continuing...")
+        return False
+
+def _new_context(browser):
+    """Create the browser context used for credit checks and generation"""
+    context = browser.new_context(
+        locale='en-US',
+        timezone_id='America/New_York',
+        viewport=BROWSER_VIEWPORT  # Full HD viewport
+    )
+    return context
 
-# Load environment
-load_dotenv()
+def _new_page(context):
+    """Open a page with fonts, videos and analytics blocked in the browser"""
+    page = context.new_page()
+    # One CDP session per page; images stay since result previews are read from the page
+    block_urls(page, MEDIA_FONT_URL_PATTERNS + ANALYTICS_URL_PATTERNS)
+    return page
+
+def _on_page(url, target_url):
+    """Same path and ?type= as target_url (other query params may change after redirects)"""
+    current, target = urlparse(url), urlparse(target_url)
+    return (current.path == target.path
+            and parse_qs(current.query).get("type") == parse_qs(target.query).get("type"))
+
+def _reset_site_storage(context):
+    """
+    Wipe everything the previous account left in the shared context
+    
+    Every origin holding storage (Dreamina plus CapCut SSO/login subdomains,
+    as listed by storage_state) gets its localStorage, IndexedDB, service
+    workers and Cache Storage cleared via CDP Storage.clearDataForOrigin, and
+    all cookies are dropped; the HTTP cache is kept. The CDP call needs a page
+    session so it hits this context's storage partition.
+    """
+    origins = {DREAMINA_ROOT_URL}
+    origins.update(entry["origin"] for entry in context.storage_state()["origins"])
+    
+    page = context.new_page()
+    try:
+        cdp = context.new_cdp_session(page)
+        for origin in origins:
+            cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    finally:
+        page.close()
+    context.clear_cookies()
+
+class _StdoutFirstStderr:
+    """stderr proxy that flushes the block-buffered stdout before each write"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def write(self, text):
+        # Keeps tracebacks after the log lines that led to them (launcher merges both pipes)
+        sys.stdout.flush()
+        return self._stream.write(text)
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
 
 def main():
     print("=" * 80)
     print("🚀 Dreamina Multi-Account Image Generator (UI-based)")
     print("=" * 80)
     
-    # Load accounts
-    accounts = load_accounts(COOKIES_FOLDER)
-    if not accounts:
-        print("❌ No accounts found. Exiting.")
-        return
-    
     # Get prompt file from env or ask user
     prompt_file = PROMPT_FILE
     if not prompt_file:
@@ -69,83 +117,108 @@ def main():
         print(f"❌ Prompt file not found: {prompt_file}")
         return
     
-    # Load prompts
-    try:
-        prompts = load_prompts_from_file(prompt_file)
-    except Exception as exc:
-        print(f"❌ Error loading prompts: {exc}")
-        return
-    
-    if not prompts:
-        print("❌ No prompts found")
-        return
-    
-    print(f"\n📝 Total prompts to generate: {len(prompts)}")
-    
-    # Get aspect ratio from env (will be single ratio per worker, set by launcher)
-    aspect_ratio = os.getenv('ASPECT_RATIO', '16:9')
-    print(f"📐 Aspect ratio: {aspect_ratio}")
-    print(f"🎨 Images per prompt: {IMAGE_COUNT}")
-    print(f"💰 Credits per generation: {CREDITS_PER_GENERATION}")
+    # Load accounts and prompts in the background while the browser starts
+    loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="loader")
+    accounts_future = loader.submit(load_accounts, COOKIES_FOLDER)
+    prompts_future = loader.submit(load_prompts_from_file, prompt_file)
+    loader.shutdown(wait=False)
     
     # Start browser
     with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=BROWSER_HEADLESS,
-            args=BROWSER_ARGS
-        )
+        if BROWSER_CDP_URL:
+            # Attach to a shared Chrome; each account still gets its own context
+            print(f"🔗 Connecting to shared browser: {BROWSER_CDP_URL}")
+            browser = p.chromium.connect_over_cdp(BROWSER_CDP_URL)
+        else:
+            browser = p.chromium.launch(
+                headless=BROWSER_HEADLESS,
+                args=BROWSER_ARGS
+            )
         
         try:
-            remaining_prompts = prompts[:]
+            accounts = accounts_future.result()
+            if not accounts:
+                print("❌ No accounts found. Exiting.")
+                return
+            
+            try:
+                prompts = prompts_future.result()
+            except Exception as exc:
+                print(f"❌ Error loading prompts: {exc}")
+                return
+            
+            if not prompts:
+                print("❌ No prompts found")
+                return
+            
+            print(f"\n📝 Total prompts to generate: {len(prompts)}")
+            
+            # Single ratio per worker (read from env once in config)
+            aspect_ratio = ASPECT_RATIO
+            print(f"📐 Aspect ratio: {aspect_ratio}")
+            print(f"🎨 Images per prompt: {IMAGE_COUNT}")
+            print(f"💰 Credits per generation: {CREDITS_PER_GENERATION}")
+            
+            generation_url = TARGET_URL
+            cursor = 0  # Index of the next unprocessed prompt
+            total_prompts = len(prompts)
             account_index = 0
             global_prompt_counter = 1
             
-            while remaining_prompts and account_index < len(accounts):
+            # Image downloads of prompt N run while prompt N+1 is submitted in the UI
+            download_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="download")
+            download_futures = []  # (prompt, expected_images, future) checked before the summary
+            http_clients = []  # One per account; closed once its queued downloads are done
+            
+            # One context for the whole run: the HTTP cache and compiled JS stay warm across
+            # accounts (no routes are registered, which would disable the cache)
+            context = _new_context(browser)
+            
+            while cursor < total_prompts and account_index < len(accounts):
                 account = accounts[account_index]
                 
                 print(f"\n{'=' * 80}")
                 print(f"👤 Account: {account['name']}")
                 print(f"{'=' * 80}")
                 
+                # Start from empty site storage on every switch, including skipped accounts
+                _reset_site_storage(context)
+                context.add_cookies(account["cookies"])  # Cleaned by load_accounts
+                
                 # Check credits
-                credits = check_account_credits(account, browser)
+                credits = check_account_credits(account, existing_context=context)
                 if credits is None or credits < CREDITS_PER_GENERATION:
                     print(f"   ⚠️  Insufficient credits, switching account...")
+                    if credits is None:
+                        # Auth or credit lookup failed: don't let any leftover state reach the next account
+                        context.close()
+                        context = _new_context(browser)
                     account_index += 1
                     continue
                 
                 # Calculate how many prompts this account can handle
                 max_generations = credits // CREDITS_PER_GENERATION
-                prompts_to_process = min(max_generations, len(remaining_prompts))
+                prompts_to_process = min(max_generations, total_prompts - cursor)
                 
                 print(f"   💰 Available credits: {credits}")
                 print(f"   📊 Can process: {prompts_to_process} prompt(s)")
                 
-                # Create browser context for this account
-                context = browser.new_context(
-                    locale='en-US',
-                    timezone_id='America/New_York',
-                    viewport=BROWSER_VIEWPORT  # Full HD viewport
-                )
-                context.add_cookies(clean_cookies(account["cookies"]))
-                page = context.new_page()
+                page = _new_page(context)
                 
                 try:
                     # Navigate to generation page
                     print(f"\n   🌐 Navigating to generation page...")
                     page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=60000)
                     
-                    # Extended wait for page to load completely
+                    # Wait for the generation UI to render
                     print(f"   ⏳ Waiting for generation page to fully load...")
-                    time.sleep(4)
+                    _wait_for_prompt_box(page, timeout=15000)
                     
                     # Ensure we're on the correct generation URL before proceeding
-                    generation_url = "https://dreamina.capcut.com/ai-tool/generate?type=image"
-                    current_url = page.url
-                    if generation_url not in current_url:
+                    if not _on_page(page.url, generation_url):
                         print(f"   🔄 Not on generation page, navigating to: {generation_url}")
                         page.goto(generation_url, wait_until="domcontentloaded", timeout=60000)
-                        time.sleep(3)
+                        _wait_for_prompt_box(page, timeout=15000)
                         print(f"   ✅ Now on generation page")
                     else:
                         print(f"   ✅ Already on generation page")
@@ -156,132 +229,60 @@ def main():
                         page.evaluate(f"""
                             document.body.style.zoom = '{BROWSER_ZOOM_LEVEL}';
                             document.documentElement.style.zoom = '{BROWSER_ZOOM_LEVEL}';
-                        """)
-                        time.sleep(2)  # Extended wait after zoom
+                        """)  # Applied synchronously; later waits see the zoomed layout
                     except Exception as e:
                         print(f"   ⚠️  Could not apply zoom: {e}")
                     
                     # Handle any modal
-                    try:
-                        modal = page.locator('div[class*="lv-modal-wrapper"]')
-                        modal.first.wait_for(state="visible", timeout=3000)
-                        print("   📱 Modal detected, closing...")
-                        
-                        # Handle multiple modals by closing them one by one
-                        modal_count = modal.count()
-                        print(f"   📱 Found {modal_count} modal(s)")
-                        
-                        for i in range(modal_count):
-                            try:
-                                # Press Escape to close modals
-                                page.keyboard.press("Escape")
-                                time.sleep(0.5)  # Small delay between key presses
-                            except Exception as e:
-                                print(f"   ⚠️  Error closing modal {i+1}: {e}")
-                        
-                        # Wait for all modals to disappear
-                        try:
-                            # Wait for the modals to be hidden with a reasonable timeout
-                            page.wait_for_function(
-                                "() => document.querySelectorAll('div[class*=\"lv-modal-wrapper\"]').length === 0 || "
-                                "Array.from(document.querySelectorAll('div[class*=\"lv-modal-wrapper\"]')).every(el => "
-                                "getComputedStyle(el).display === 'none' || getComputedStyle(el).visibility === 'hidden')",
-                                timeout=5000
-                            )
-                            print("   ✅ All modals closed")
-                        except PlaywrightTimeoutError:
-                            print("   ⚠️  Some modals may still be visible")
-                        
-                        time.sleep(2)  # Extended wait after modal close
-                    except:
-                        pass
+                    handle_modal_sync(page)
                     
-                    # Additional wait for UI to stabilize
-                    print("   ⏳ Waiting for UI to stabilize...")
-                    time.sleep(3)
-                    
-                    # Verify we're on the generation page and UI is ready
+                    # One wait on the prompt box replaces the readyState poll and the selector probe loop
                     print("   🔍 Verifying page state...")
-                    try:
-                        # Wait for key UI elements to be present
-                        page.wait_for_function(
-                            "() => document.readyState === 'complete'",
-                            timeout=10000
-                        )
-                        
-                        # Check if we can find any generation-related elements
-                        ui_indicators = [
-                            'textarea[placeholder*="prompt"]',
-                            'textarea[placeholder*="描述"]',
-                            'button[class*="button"]',
-                            'div[class*="ratio"]'
-                        ]
-                        
-                        found_ui = False
-                        for selector in ui_indicators:
-                            try:
-                                if page.locator(selector).count() > 0:
-                                    print(f"   ✅ Found UI element: {selector}")
-                                    found_ui = True
-                                    break
-                            except:
-                                continue
-                        
-                        if not found_ui:
-                            print("   ⚠️  No UI elements found, but continuing anyway...")
-                        else:
-                            print("   ✅ Page UI is ready for interaction")
-                        
-                    except Exception as e:
-                        print(f"   ⚠️  UI verification failed: {e}, but continuing...")
+                    if _wait_for_prompt_box(page):
+                        print("   ✅ Page UI is ready for interaction")
+                    
+                    # One download client per account: connections stay open across its prompts
+                    http_client = browser_http_client(page)
+                    http_clients.append(http_client)
                     
                     # Process prompts for this account (one by one with credit check)
                     processed_count = 0
+                    budget = max_generations  # Generations left before credits run out
                     
-                    for i, prompt in enumerate(remaining_prompts[:prompts_to_process], 1):
+                    for i, prompt in enumerate(islice(prompts, cursor, cursor + prompts_to_process), 1):
                         print(f"\n   {'─' * 60}")
                         print(f"   🎨 Prompt {i}/{prompts_to_process} (#{global_prompt_counter})")
+                        sys.stdout.flush()  # One flush per prompt pushes the previous prompt's log out
                         
-                        # Ensure we're on the correct generation URL before each generation
-                        generation_url = "https://dreamina.capcut.com/ai-tool/generate?type=image"
-                        current_url = page.url
-                        if generation_url not in current_url:
+                        # Re-navigate only if the app actually left the generation page
+                        if not _on_page(page.url, generation_url):
                             print(f"   🔄 Redirected away, navigating back to: {generation_url}")
                             page.goto(generation_url, wait_until="domcontentloaded", timeout=60000)
-                            time.sleep(5)  # Longer wait for page to load completely
+                            _wait_for_prompt_box(page, timeout=15000)
                             
                             # Handle modals again after navigation
-                            try:
-                                modal = page.locator('div[class*="lv-modal-wrapper"]')
-                                modal.first.wait_for(state="visible", timeout=3000)
-                                print("   📱 Modal detected after navigation, closing...")
-                                modal_count = modal.count()
-                                for i in range(modal_count):
-                                    page.keyboard.press("Escape")
-                                    time.sleep(0.5)
-                                time.sleep(2)
-                            except:
-                                pass
+                            handle_modal_sync(page)
                             
                             print(f"   ✅ Back on generation page")
                         
                         # Additional verification that page is ready
                         print("   🔍 Verifying page is ready for generation...")
                         try:
-                            page.wait_for_function(
-                                "() => document.readyState === 'complete'",
-                                timeout=5000
-                            )
-                            time.sleep(1)  # Extra stabilization time
-                        except:
+                            # Resolves immediately once the load event has fired (no JS polling)
+                            page.wait_for_load_state("load", timeout=5000)
+                        except PlaywrightTimeoutError:
                             print("   ⚠️  Page readiness check failed, continuing anyway...")
                         
                         # Generate via UI (aspect_ratio is fixed per worker)
-                        success = generate_image_via_ui(page, prompt, aspect_ratio)
+                        success = generate_image_via_ui(page, prompt, aspect_ratio,
+                                                        download_executor=download_pool,
+                                                        download_futures=download_futures,
+                                                        http_client=http_client)
                         
                         if success:
                             print(f"   ✅ Generation #{global_prompt_counter} completed")
                             processed_count += 1
+                            budget -= 1
                         else:
                             print(f"   ❌ Generation #{global_prompt_counter} failed")
                         
@@ -289,31 +290,43 @@ def main():
                         
                         # Check credit after generation (before processing next prompt)
                         if i < prompts_to_process:
-                            print(f"\n   💰 Checking remaining credits...")
-                            time.sleep(3)  # Extended wait for credit update
+                            # Trust the local budget; re-poll the browser only periodically,
+                            # when it runs out, or after a failure (credits may not have been spent)
+                            needs_recheck = (not success
+                                             or budget <= 0
+                                             or i % CREDIT_RECHECK_INTERVAL == 0)
                             
-                            # Check credit by navigating to user profile
-                            try:
-                                remaining_credits = check_account_credits(account, browser, existing_context=context)
+                            if not needs_recheck:
+                                print(f"\n   💰 Estimated generations left: {budget}")
+                            else:
+                                print(f"\n   💰 Checking remaining credits...")
+                                time.sleep(3)  # Extended wait for credit update
                                 
-                                if remaining_credits is None:
-                                    print(f"   ⚠️  Could not check credits, continuing anyway...")
-                                elif remaining_credits < CREDITS_PER_GENERATION:
-                                    print(f"   ⚠️  Insufficient credits ({remaining_credits} < {CREDITS_PER_GENERATION})")
-                                    print(f"   🔄 Stopping this account, will switch to next...")
-                                    break  # Exit loop to switch account
-                                else:
-                                    print(f"   ✅ Remaining credits: {remaining_credits} (enough for next gen)")
-                            except Exception as e:
-                                print(f"   ⚠️  Error checking credits: {e}")
-                                print(f"   ⚠️  Continuing anyway...")
+                                # Read the credit badge on the generation page; navigate only if it is missing
+                                try:
+                                    remaining_credits = read_page_credits(page)
+                                    if remaining_credits is None:
+                                        remaining_credits = check_account_credits(account, existing_context=context)
+                                    
+                                    if remaining_credits is None:
+                                        print(f"   ⚠️  Could not check credits, continuing anyway...")
+                                    elif remaining_credits < CREDITS_PER_GENERATION:
+                                        print(f"   ⚠️  Insufficient credits ({remaining_credits} < {CREDITS_PER_GENERATION})")
+                                        print(f"   🔄 Stopping this account, will switch to next...")
+                                        break  # Exit loop to switch account
+                                    else:
+                                        budget = remaining_credits // CREDITS_PER_GENERATION
+                                        print(f"   ✅ Remaining credits: {remaining_credits} (enough for next gen)")
+                                except Exception as e:
+                                    print(f"   ⚠️  Error checking credits: {e}")
+                                    print(f"   ⚠️  Continuing anyway...")
                             
-                            # Wait between generations
-                            print(f"   ⏳ Waiting 3s before next generation...")
-                            time.sleep(3)
+                            # Wait until the prompt box is back before the next generation
+                            print(f"   ⏳ Waiting for the UI before next generation...")
+                            _wait_for_prompt_box(page)
                     
-                    # Remove processed prompts
-                    remaining_prompts = remaining_prompts[processed_count:]
+                    # Advance past processed prompts
+                    cursor += processed_count
                     
                 except Exception as e:
                     print(f"   ❌ Error during generation: {e}")
@@ -321,21 +334,49 @@ def main():
                     traceback.print_exc()
                 finally:
                     page.close()
-                    context.close()
-                    time.sleep(1)  # Cleanup delay
                 
                 account_index += 1
             
+            # Let background downloads finish; a prompt only counts once all its images are saved
+            print(f"\n⏳ Waiting for image downloads to finish...")
+            failed_downloads = []
+            for prompt, expected_images, future in download_futures:
+                try:
+                    downloaded = future.result()
+                except Exception as exc:
+                    print(f"   ❌ Download error for prompt: {prompt[:60]}... ({exc})")
+                    import traceback
+                    traceback.print_exception(exc)
+                    downloaded = 0
+                if downloaded < expected_images:
+                    failed_downloads.append(prompt)
+            download_pool.shutdown(wait=True)
+            for http_client in http_clients:
+                http_client.close()
+            
             # Summary
             print(f"\n{'=' * 80}")
             print("🎉 Generation Complete!")
             print(f"{'=' * 80}")
-            print(f"✅ Processed: {len(prompts) - len(remaining_prompts)} prompt(s)")
-            if remaining_prompts:
-                print(f"⚠️  Remaining: {len(remaining_prompts)} prompt(s) (no credits)")
+            print(f"✅ Processed: {cursor - len(failed_downloads)} prompt(s)")
+            if failed_downloads:
+                print(f"❌ Download incomplete: {len(failed_downloads)} prompt(s)")
+                for prompt in failed_downloads:
+                    print(f"   - {prompt[:80]}")
+            if cursor < total_prompts:
+                print(f"⚠️  Remaining: {total_prompts - cursor} prompt(s) (no credits)")
             
         finally:
             browser.close()
 
 if __name__ == "__main__":
+    # launcher_gui stops workers with CTRL_BREAK on Windows; raise KeyboardInterrupt
+    # so the finally blocks close the browser instead of the process dying mid-write
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, signal.default_int_handler)
+    
+    # Piped to a launcher: buffer output in blocks and flush once per prompt instead of per line
+    if not sys.stdout.isatty() and hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False, write_through=False)
+        sys.stderr = _StdoutFirstStderr(sys.stderr)
     main()
@@ -1,4 +1,5 @@
 import csv
+from itertools import chain
 from pathlib import Path
 
 def load_prompts_from_file(file_path: str) -> list[str]:
@@ -31,16 +32,15 @@ def _load_from_csv(path: Path) -> list[str]:
     prompts = []
     
     with path.open(encoding="utf-8-sig", newline="") as f:
-        try:
-            # Try to detect dialect
-            sample = f.read(2048)
-            f.seek(0)
-            dialect = csv.Sniffer().sniff(sample, delimiters=",\t")
-        except csv.Error:
-            f.seek(0)
-            dialect = csv.get_dialect("excel")
+        # Only CSV/TSV are supported: pick the dialect from the first line
+        # and feed that line back to the reader instead of re-reading the file
+        first_line = f.readline()
+        if path.suffix.lower() == ".tsv" or "\t" in first_line:
+            dialect = csv.excel_tab
+        else:
+            dialect = csv.excel
         
-        reader = csv.reader(f, dialect)
+        reader = csv.reader(chain([first_line], f), dialect)
         
         # Check if first row is header
         first_row = next(reader, [])
@@ -0,0 +1,64 @@
+"""
+Block heavy resources and analytics requests for Playwright pages and contexts
+"""
+import re
+
+# Resource types a credit check never needs (it only reads DOM text)
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+_BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "segment.io", "hotjar.com", "sentry.io", "connect.facebook.net", "clarity.ms",
+)
+# Matches requests whose host is (a subdomain of) one of _BLOCKED_HOSTS
+_BLOCKED_HOST_RE = re.compile(
+    r"^https?://(?:[^/?#]*\.)?(?:" + "|".join(map(re.escape, _BLOCKED_HOSTS)) + r")(?::\d+)?(?:[/?#]|$)"
+)
+# Same hosts as CDP URL patterns (the host itself and any subdomain)
+ANALYTICS_URL_PATTERNS = [
+    pattern for host in _BLOCKED_HOSTS for pattern in (f"*://{host}/*", f"*://*.{host}/*")
+]
+
+# Fonts and video on the generation page, blocked by URL pattern inside the browser
+_MEDIA_FONT_EXTENSIONS = ("woff", "woff2", "ttf", "otf", "eot", "mp4", "webm", "m3u8")
+MEDIA_FONT_URL_PATTERNS = [
+    pattern for ext in _MEDIA_FONT_EXTENSIONS for pattern in (f"*.{ext}", f"*.{ext}?*")
+]
+
+def _route_light(route):
+    """Abort heavy resources and analytics beacons, let everything else through"""
+    request = route.request
+    if request.resource_type in _BLOCKED_RESOURCE_TYPES or _BLOCKED_HOST_RE.match(request.url):
+        route.abort()
+    else:
+        route.continue_()
+
+def block_heavy_resources(target):
+    """
+    Skip images, media, fonts and analytics for a page or context
+    
+    Stylesheets are kept: modal/visibility checks depend on computed styles.
+    
+    Args:
+        target: Playwright Page or BrowserContext
+    """
+    target.route("**/*", _route_light)
+
+def block_urls(page, patterns):
+    """
+    Block URL patterns for one page via CDP Network.setBlockedURLs
+    
+    Unlike page/context.route(), this does not disable the HTTP cache, and the
+    browser drops matching requests itself instead of asking Python about each
+    one. The session has to enable the Network domain, so it streams that page's
+    network events to the driver; call this once per page with every pattern
+    (a later call on a new session adds another stream).
+    
+    Args:
+        page: Playwright Page (Chromium only)
+        patterns: URL patterns, '*' matches any run of characters
+    """
+    cdp = page.context.new_cdp_session(page)
+    # No response bodies are ever read through this session, so keep none buffered
+    cdp.send("Network.enable", {"maxTotalBufferSize": 0, "maxResourceBufferSize": 0})
+    cdp.send("Network.setBlockedURLs", {"urls": list(patterns)})
+    return cdp
@@ -0,0 +1,15 @@
+import random
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    """
+    Exponential backoff delay with full jitter
+    
+    Args:
+        attempt: Zero-based retry attempt number
+        base: Delay scale in seconds for the first attempt
+        cap: Maximum delay in seconds
+    
+    Returns:
+        Seconds to sleep before the next attempt
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -5,13 +5,6 @@ Simple Multi-Instance Launcher for Dreamina
 Chỉ cần 1 file .env để config tất cả
 """
 
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-Simple Multi-Instance Launcher for Dreamina
-Chỉ cần 1 file .env để config tất cả
-"""
-
 # IMPORT ENCODING FIX TRƯỚC TIÊN - TRIỆT ĐỂ FIX  
 from encoding_fix import safe_print
 import builtins
@@ -115,6 +108,9 @@ BROWSER_HEADLESS=false
 
 # Delay giữa các instances (seconds)
 STARTUP_DELAY=5
+
+# Gộp stderr vào stdout trong launcher_gui (true/false)
+MERGE_STDERR=true
 '''
         
         with open(self.env_file, 'w', encoding='utf-8') as f:
@@ -150,8 +146,8 @@ STARTUP_DELAY=5
             if not cookies_dir.exists():
                 errors.append(f"❌ Missing cookies folder: {cookies_dir}")
             else:
-                cookie_files = list(cookies_dir.glob("*.json"))
-                if len(cookie_files) == 0:
+                # Only need to know one exists; stop at the first match
+                if next(cookies_dir.glob("*.json"), None) is None:
                     errors.append(f"❌ Empty cookies folder: {cookies_dir}")
         
         # 3. Validate prompt files
@@ -6,45 +6,22 @@ Sử dụng logic giống main.py và credit_checker.py
 """
 
 from playwright.sync_api import sync_playwright
-import json
 import time
 from pathlib import Path
 
 # Import modules từ project
-from cookie_handler import load_accounts, clean_cookies
+from cookie_handler import load_accounts, load_cookies_from_file, clean_cookies
 
-def load_cookies_from_file(cookie_file_path: str):
-    """Load cookies from file format (session_id on first line, JSON on remaining lines)"""
-    try:
-        with open(cookie_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        session_id = lines[0].strip()
-        json_content = ''.join(lines[1:])
-        cookie_data = json.loads(json_content)
-        
-        print(f"✅ Loaded {len(cookie_data)} cookies from {Path(cookie_file_path).name}")
-        print(f"🔑 Session ID: {session_id[:20]}...")
-        
-        return clean_cookies(cookie_data)
-        
-    except Exception as e:
-        print(f"❌ Error loading cookies: {e}")
-        return []
-
-def clean_cookies(cookies):
-    """Clean sameSite field from cookies to avoid browser compatibility issues"""
-    if not cookies:
-        return []
-    
-    # Ensure each cookie has a valid sameSite value
-    valid_same_site = {"Strict", "Lax", "None"}
-    for cookie in cookies:
-        if cookie.get("sameSite") not in valid_same_site:
-            cookie["sameSite"] = "Lax"
-    
-    print(f"🧹 Cleaned {len(cookies)} cookies")
-    return cookies
+# Login buttons (not authenticated) and avatar (authenticated) as selector unions
+LOGIN_SEL = ", ".join([
+    'button:has-text("Sign in")',
+    'button:has-text("Đăng nhập")',
+    'a:has-text("Sign in")',
+])
+AUTH_SEL = ", ".join([
+    'img.dreamina-component-avatar',
+    'div.dreamina-component-avatar-container',
+])
 
 def test_single_account(account: dict, browser):
     """Test authentication cho 1 account với logic giống main.py"""
@@ -100,58 +77,22 @@ def test_single_account(account: dict, browser):
         except:
             print("   ✅ No modal popup found")
         
-        # Wait additional time for UI to stabilize
-        print("   ⏳ Waiting for UI to stabilize...")
-        time.sleep(3)
-        
         # Check authentication (giống credit_checker.py logic)
         print("   🔍 Checking authentication status...")
         
-        # Check for login buttons với wait
-        login_button_selectors = [
-            'button:has-text("Sign in")',
-            'button:has-text("sign in")',
-            'button:has-text("Đăng nhập")',
-            'a:has-text("Sign in")',
-        ]
-        
-        login_found = False
-        for selector in login_button_selectors:
-            try:
-                print(f"   🔍 Checking for login button: {selector}")
-                element = page.locator(selector)
-                # Wait a bit for element to possibly appear
-                page.wait_for_timeout(1000)
-                if element.count() > 0:
-                    print(f"   ❌ Found login button: {selector}")
-                    login_found = True
-                    break
-            except:
-                continue
+        # Wait until either a login button or the avatar shows up, then branch
+        try:
+            page.wait_for_selector(f"{AUTH_SEL}, {LOGIN_SEL}", timeout=10000)
+        except Exception:
+            print("   ⚠️  Neither login button nor avatar appeared")
         
-        if login_found:
+        if page.locator(LOGIN_SEL).count() > 0:
             print("   ❌ NOT AUTHENTICATED - Found login indicators")
             return {"name": account["name"], "authenticated": False, "credits": None, "generation_access": False}
         
-        # Check for user avatar với wait (giống credit_checker.py)
-        auth_indicators = [
-            'img.dreamina-component-avatar',
-            'div.dreamina-component-avatar-container',
-        ]
-        
-        print("   🔍 Looking for authentication indicators...")
-        for selector in auth_indicators:
-            try:
-                print(f"   🔍 Checking for: {selector}")
-                element = page.locator(selector)
-                # Wait for potential authentication elements
-                page.wait_for_timeout(2000)
-                if element.count() > 0:
-                    print(f"   ✅ AUTHENTICATED - Found: {selector}")
-                    auth_status = True
-                    break
-            except:
-                continue
+        auth_status = page.locator(AUTH_SEL).count() > 0
+        if auth_status:
+            print("   ✅ AUTHENTICATED - Found user avatar")
         
         if not auth_status:
             print("   ❌ NOT AUTHENTICATED - No avatar found")
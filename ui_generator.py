@@ -3,8 +3,62 @@ UI-based image generation using Playwright
 Clicks through the UI to generate images instead of using API
 """
 from playwright.sync_api import Page, expect, TimeoutError as PlaywrightTimeoutError
+import httpx
+import re
 import time
-import os
+from concurrent.futures import Executor
+from api_generator import download_images
+from config import ASPECT_RATIO, OUTPUT_DIR, VERBOSE_LOGGING
+
+# Compiled once; used for every preview URL
+_RESIZE_RE = re.compile(r'aigc_resize:\d+:\d+')
+_RESOLUTION_RE = re.compile(r'(\d+):(\d+)')
+
+# Selectors for the quality button that opens the aspect ratio dropdown
+_HIGH_2K_SELECTORS = (
+    ':text("High (2K)")',           # Direct text selector (English)
+    ':text("Cao (2K)")',            # Direct text selector (Vietnamese)
+    'text=High (2K)',               # Playwright text selector (English)
+    'text=Cao (2K)',                # Playwright text selector (Vietnamese)
+    ':text-is("High (2K)")',        # Exact text match (English)
+    ':text-is("Cao (2K)")',         # Exact text match (Vietnamese)
+    '*:has-text("High (2K)")',      # Any element containing text (English)
+    '*:has-text("Cao (2K)")',       # Any element containing text (Vietnamese)
+    'button:has-text("High (2K)")', # Button containing text (English)
+    'button:has-text("Cao (2K)")',  # Button containing text (Vietnamese)
+    'span:has-text("High (2K)")',   # Span containing text (English)
+    'span:has-text("Cao (2K)")',    # Span containing text (Vietnamese)
+    'div:has-text("High (2K)")',    # Div containing text (English)
+    'div:has-text("Cao (2K)")',     # Div containing text (Vietnamese)
+)
+
+# Prompt textarea selectors, most specific first
+_TEXTAREA_SELECTORS = (
+    'textarea[placeholder*="prompt"]',     # Textarea with prompt in placeholder
+    'textarea[placeholder*="Prompt"]',     # Textarea with Prompt in placeholder
+    'textarea[placeholder*="描述"]',        # Chinese placeholder
+    'textarea',                            # Any textarea
+)
+
+def _expect_ratio_selected(page: Page, ratio: str, timeout: int = 2000):
+    """Wait until an option showing the ratio is marked selected instead of sleeping a fixed time"""
+    selected = page.locator(", ".join(
+        f'{state}:has-text("{ratio}")'
+        for state in ('[aria-checked="true"]', '[aria-selected="true"]', '[class*="selected"]',
+                      '[class*="checked"]', '[class*="active"]')
+    ))
+    try:
+        expect(selected.first).to_be_attached(timeout=timeout)
+    except AssertionError:
+        print(f"   ⚠️  Selection of {ratio} not confirmed, continuing...")
+
+def _wait_until_enabled(button, timeout: int = 2500) -> bool:
+    """Wait until the app enables the button (it does once it has taken the prompt text)"""
+    try:
+        expect(button).to_be_enabled(timeout=timeout)
+        return True
+    except AssertionError:
+        return False
 
 def click_generate_button(page: Page) -> bool:
     """Click the generate button to open prompt input"""
@@ -42,13 +96,29 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
         desired_ratio = desired_ratio.split(',')[0].strip()
         print(f"   🔧 Workaround: Split '{original_ratio}' -> using first item '{desired_ratio}'")
     
+    # Ratio option selectors depend only on desired_ratio; build them once for all retries
+    ratio_text_selectors = [
+        f':text("{desired_ratio}")',           # Direct text selector
+        f'text={desired_ratio}',               # Playwright text selector  
+        f':text-is("{desired_ratio}")',        # Exact text match
+        f'*:has-text("{desired_ratio}")',      # Any element containing ratio text
+        f'label:has-text("{desired_ratio}")',  # Label containing ratio text
+        f'span:has-text("{desired_ratio}")',   # Span containing ratio text
+        f'div:has-text("{desired_ratio}")',    # Div containing ratio text
+        f'button:has-text("{desired_ratio}")', # Button containing ratio text
+    ]
+    
     for attempt in range(max_retries):
         try:
             if attempt > 0:
                 print(f"\n   🔄 Retry attempt {attempt + 1}/{max_retries}...")
                 print("   🔄 Refreshing page...")
                 page.reload(wait_until="domcontentloaded")
-                time.sleep(3)  # Wait for page to fully load
+                # Page is usable once the prompt box is back
+                try:
+                    page.locator('textarea').first.wait_for(state="visible", timeout=15000)
+                except PlaywrightTimeoutError:
+                    print("   ⚠️  Prompt box not visible after refresh, continuing...")
             
             print(f"   📐 Processing aspect ratio: {desired_ratio}...")
             
@@ -66,29 +136,12 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
             # Step 1: Click directly on "High (2K)" or "Cao (2K)" text to open aspect ratio dropdown
             print("   🖱️  Looking for 'High (2K)' or 'Cao (2K)' text to click...")
             
-            # Simple approach - click directly on the text (support both English and Vietnamese)
-            high_2k_selectors = [
-                ':text("High (2K)")',           # Direct text selector (English)
-                ':text("Cao (2K)")',            # Direct text selector (Vietnamese)
-                'text=High (2K)',               # Playwright text selector (English)
-                'text=Cao (2K)',                # Playwright text selector (Vietnamese)
-                ':text-is("High (2K)")',        # Exact text match (English)
-                ':text-is("Cao (2K)")',         # Exact text match (Vietnamese)
-                '*:has-text("High (2K)")',      # Any element containing text (English)
-                '*:has-text("Cao (2K)")',       # Any element containing text (Vietnamese)
-                'button:has-text("High (2K)")', # Button containing text (English)
-                'button:has-text("Cao (2K)")',  # Button containing text (Vietnamese)
-                'span:has-text("High (2K)")',   # Span containing text (English)
-                'span:has-text("Cao (2K)")',    # Span containing text (Vietnamese)
-                'div:has-text("High (2K)")',    # Div containing text (English)
-                'div:has-text("Cao (2K)")',     # Div containing text (Vietnamese)
-            ]
-            
             clicked_high_2k = False
             
-            for selector in high_2k_selectors:
+            for selector in _HIGH_2K_SELECTORS:
                 try:
-                    print(f"   🔍 Trying to click: {selector}")
+                    if VERBOSE_LOGGING:
+                        print(f"   🔍 Trying to click: {selector}")
                     element = page.locator(selector).first
                     
                     # Wait for element to be visible
@@ -103,7 +156,8 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
                         break
                         
                 except Exception as e:
-                    print(f"   ⏳ Selector failed: {str(e)[:50]}...")
+                    if VERBOSE_LOGGING:
+                        print(f"   ⏳ Selector failed: {str(e)[:50]}...")
                     continue
             
             if not clicked_high_2k:
@@ -120,23 +174,12 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
             # Step 3: Click directly on the desired ratio text
             print(f"   🎯 Looking for aspect ratio: {desired_ratio}...")
             
-            # Simple approach - click directly on the ratio text
-            ratio_text_selectors = [
-                f':text("{desired_ratio}")',           # Direct text selector
-                f'text={desired_ratio}',               # Playwright text selector  
-                f':text-is("{desired_ratio}")',        # Exact text match
-                f'*:has-text("{desired_ratio}")',      # Any element containing ratio text
-                f'label:has-text("{desired_ratio}")',  # Label containing ratio text
-                f'span:has-text("{desired_ratio}")',   # Span containing ratio text
-                f'div:has-text("{desired_ratio}")',    # Div containing ratio text
-                f'button:has-text("{desired_ratio}")', # Button containing ratio text
-            ]
-            
             clicked_ratio = False
             
             for selector in ratio_text_selectors:
                 try:
-                    print(f"   🔍 Trying to click ratio: {selector}")
+                    if VERBOSE_LOGGING:
+                        print(f"   🔍 Trying to click ratio: {selector}")
                     element = page.locator(selector).first
                     
                     # Wait for element to be visible
@@ -148,21 +191,19 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
                         # Scroll element into view
                         element.scroll_into_view_if_needed()
                         
-                        # Hover over element
-                        print(f"   🎯 Hovering and clicking '{desired_ratio}'...")
-                        element.hover()
-                        time.sleep(0.3)  # Brief hover delay
-                        
-                        # Click with left mouse button explicitly
+                        # Click with left mouse button explicitly (click() hovers first)
+                        print(f"   🎯 Clicking '{desired_ratio}'...")
                         element.click(button="left")
                         
                         print(f"   ✅ Clicked aspect ratio: {desired_ratio}")
                         clicked_ratio = True
-                        time.sleep(1)  # Wait for selection to register
+                        # Returns as soon as the option shows as selected
+                        _expect_ratio_selected(page, desired_ratio)
                         break
                         
                 except Exception as e:
-                    print(f"   ⏳ Selector failed: {str(e)[:50]}...")
+                    if VERBOSE_LOGGING:
+                        print(f"   ⏳ Selector failed: {str(e)[:50]}...")
                     continue
             
             # Critical check - MUST select aspect ratio to continue
@@ -177,29 +218,20 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
             # Step 4: Input prompt into textarea
             print(f"   ✍️  Entering prompt: {prompt[:60]}...")
             
-            # Find textarea by multiple simple selectors
-            textarea_selectors = [
-                'textarea[placeholder*="prompt"]',     # Textarea with prompt in placeholder
-                'textarea[placeholder*="Prompt"]',     # Textarea with Prompt in placeholder
-                'textarea[placeholder*="描述"]',        # Chinese placeholder
-                'textarea',                            # Any textarea
-            ]
-            
             textarea_found = False
             
-            for selector in textarea_selectors:
+            for selector in _TEXTAREA_SELECTORS:
                 try:
-                    print(f"   🔍 Looking for textarea with: {selector}")
+                    if VERBOSE_LOGGING:
+                        print(f"   🔍 Looking for textarea with: {selector}")
                     textarea = page.locator(selector).first
                     
                     if textarea.count() > 0:
                         print(f"   ✅ Found textarea")
                         textarea.click()
-                        time.sleep(0.5)  # Wait for focus
                         textarea.fill(prompt)
                         print("   ✅ Entered prompt")
                         textarea_found = True
-                        time.sleep(1)  # Wait for text to register
                         break
                         
                 except Exception as e:
@@ -226,19 +258,11 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
                 
                 if submit_button.count() > 0:
                     print(f"   ✅ Found submit button via specific XPath")
-                    time.sleep(0.5)  # Brief wait before checking
                     
-                    # Check if button is enabled
-                    is_disabled = submit_button.get_attribute("disabled")
-                    if is_disabled:
-                        print("   ⚠️  Submit button is disabled, waiting...")
-                        time.sleep(2)  # Wait for button to enable
-                        is_disabled = submit_button.get_attribute("disabled")
-                        if not is_disabled:
-                            print("   ✅ Submit button is now enabled")
-                        else:
-                            print("   ⚠️  Submit button still disabled, will try other selectors...")
-                            raise Exception("Button still disabled")
+                    # The app enables the button once it has registered the prompt
+                    if not _wait_until_enabled(submit_button):
+                        print("   ⚠️  Submit button still disabled, will try other selectors...")
+                        raise Exception("Button still disabled")
                     
                     # Click submit
                     print("   🖱️  Clicking submit button...")
@@ -276,23 +300,18 @@ def select_aspect_ratio_and_submit(page: Page, desired_ratio: str, prompt: str,
                 
                 for selector in submit_selectors:
                     try:
-                        print(f"   🔍 Looking for submit with: {selector}")
+                        if VERBOSE_LOGGING:
+                            print(f"   🔍 Looking for submit with: {selector}")
                         submit_button = page.locator(selector).first
                         submit_button.wait_for(state="visible", timeout=5000)
                         
                         if submit_button.count() > 0:
                             print(f"   ✅ Found submit button")
-                            time.sleep(0.5)  # Brief wait before checking
                             
-                            # Check if button is enabled
-                            is_disabled = submit_button.get_attribute("disabled")
-                            if is_disabled:
-                                print("   ⚠️  Submit button is disabled, waiting...")
-                                time.sleep(2)  # Wait for enable
-                                is_disabled = submit_button.get_attribute("disabled")
-                                if is_disabled:
-                                    print("   ❌ Submit button still disabled, trying next selector...")
-                                    continue
+                            # The app enables the button once it has registered the prompt
+                            if not _wait_until_enabled(submit_button):
+                                print("   ❌ Submit button still disabled, trying next selector...")
+                                continue
                             
                             # Click submit
                             print("   🖱️  Clicking submit button...")
@@ -358,12 +377,10 @@ def input_prompt_and_generate(page: Page, prompt: str) -> bool:
         
         # Click to focus first
         textarea.click()
-        time.sleep(0.5)
         
         # Clear existing text and input new prompt
         textarea.fill(prompt)
         print("   ✅ Entered prompt")
-        time.sleep(1)  # Wait after entering text
         
         # Click submit button
         print("   🚀 Preparing to click submit button...")
@@ -372,18 +389,11 @@ def input_prompt_and_generate(page: Page, prompt: str) -> bool:
         
         # Wait for button to be ready
         submit_button.wait_for(state="visible", timeout=10000)
-        time.sleep(0.5)
         
-        # Check if button is enabled
-        is_disabled = submit_button.get_attribute("disabled")
-        if is_disabled:
-            print("   ⚠️  Submit button is disabled, waiting...")
-            # Wait a bit and check again
-            time.sleep(2)
-            is_disabled = submit_button.get_attribute("disabled")
-            if is_disabled:
-                print("   ❌ Submit button still disabled")
-                return False
+        # The app enables the button once it has registered the prompt
+        if not _wait_until_enabled(submit_button):
+            print("   ❌ Submit button still disabled")
+            return False
         
         # Scroll button into view if needed
         submit_button.scroll_into_view_if_needed()
@@ -464,7 +474,9 @@ def wait_for_generation_complete(page: Page, timeout: int = 120) -> bool:
         print(f"   ❌ Error waiting for generation: {e}")
         return False
 
-def generate_image_via_ui(page: Page, prompt: str, aspect_ratio: str = None, output_dir: str = None) -> bool:
+def generate_image_via_ui(page: Page, prompt: str, aspect_ratio: str = None, output_dir: str = None,
+                          download_executor: Executor = None, download_futures: list = None,
+                          http_client: httpx.Client = None) -> bool:
     """
     Complete flow to generate image via UI and download results
     
@@ -473,18 +485,22 @@ def generate_image_via_ui(page: Page, prompt: str, aspect_ratio: str = None, out
         prompt: Text prompt
         aspect_ratio: Aspect ratio like "16:9" (optional, uses env if not provided)
         output_dir: Directory to save downloaded images (optional, uses OUTPUT_DIR env if not provided)
+        download_executor: Executor to download images on in the background (optional)
+        download_futures: List that receives (prompt, expected_images, future) for each background
+            download (required with download_executor); future.result() is the number of images saved
+        http_client: Client from browser_http_client() reused across prompts (optional)
     
     Returns:
-        True if generation and download succeeded
+        True if generation and download succeeded (with download_executor: the images found were
+        queued; the caller must check the future's count before counting the prompt as done)
     """
     try:
-        # Get aspect ratio from env if not provided
+        # Fall back to configured aspect ratio / output dir if not provided
         if aspect_ratio is None:
-            aspect_ratio = os.getenv('ASPECT_RATIO', '16:9')
+            aspect_ratio = ASPECT_RATIO
         
-        # Get output dir from env if not provided
         if output_dir is None:
-            output_dir = os.getenv('OUTPUT_DIR', 'outputs')
+            output_dir = OUTPUT_DIR
         
         print(f"\n🎨 Generating via UI...")
         print(f"   📝 Prompt: {prompt[:80]}...")
@@ -497,7 +513,10 @@ def generate_image_via_ui(page: Page, prompt: str, aspect_ratio: str = None, out
             return False
         
         # Step 2: Wait for generation and download images
-        if not wait_and_download_images(page, prompt, aspect_ratio, output_dir):
+        if not wait_and_download_images(page, prompt, aspect_ratio, output_dir,
+                                        download_executor=download_executor,
+                                        download_futures=download_futures,
+                                        http_client=http_client):
             print("   ❌ Failed to download images!")
             return False
         
@@ -508,7 +527,51 @@ def generate_image_via_ui(page: Page, prompt: str, aspect_ratio: str = None, out
         print(f"   ❌ Generation failed: {e}")
         return False
 
-def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_dir: str = None, expected_images: int = 4, timeout: int = 180) -> bool:
+def browser_http_client(page: Page) -> httpx.Client:
+    """
+    HTTP/2 client that looks like the page's browser to the image CDN
+    
+    Carries the context's cookies (kept scoped to their domains) and the
+    browser's User-Agent. Build it once per account and reuse it for every
+    prompt so the TLS session and HTTP/2 connections stay open; must be
+    called on the Playwright thread, and closed by the caller.
+    
+    Args:
+        page: Playwright page of the account's context
+    
+    Returns:
+        httpx.Client (thread-safe, may be used from download workers)
+    """
+    cookies = httpx.Cookies()
+    for cookie in page.context.cookies():
+        cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie.get("path", "/"))
+    
+    return httpx.Client(
+        http2=True,
+        cookies=cookies,
+        headers={"User-Agent": page.evaluate("navigator.userAgent")},
+        follow_redirects=True,
+        timeout=httpx.Timeout(60.0, connect=15.0)
+    )
+
+def _download_collected(client: httpx.Client, image_jobs: list, expected_images: int, close_client: bool = False) -> int:
+    """Download the collected (url, path) jobs; safe to run off the Playwright thread"""
+    try:
+        downloaded_count = download_images(
+            [url for url, _ in image_jobs],
+            [path for _, path in image_jobs],
+            client
+        )
+    finally:
+        if close_client:
+            client.close()
+    
+    print(f"\n   ✅ Downloaded {downloaded_count}/{expected_images} images")
+    return downloaded_count
+
+def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_dir: str = None, expected_images: int = 4, timeout: int = 180,
+                             download_executor: Executor = None, download_futures: list = None,
+                             http_client: httpx.Client = None) -> bool:
     """
     Wait for generation to complete and download all generated images
     
@@ -519,19 +582,20 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
         output_dir: Directory to save downloaded images (uses OUTPUT_DIR env if not provided)
         expected_images: Number of images to wait for (default 4)
         timeout: Maximum time to wait in seconds
+        download_executor: Executor to download images on in the background (optional)
+        download_futures: List that receives (prompt, expected_images, future) for background downloads
+        http_client: Client from browser_http_client() to reuse (optional; a one-off client otherwise)
     
     Returns:
         True if all images downloaded successfully
     """
-    import os
-    import re
     import urllib.parse
     from pathlib import Path
     
     try:
-        # Get output dir from env if not provided
+        # Fall back to configured output dir if not provided
         if output_dir is None:
-            output_dir = os.getenv('OUTPUT_DIR', 'outputs')
+            output_dir = OUTPUT_DIR
             
         print(f"\n   ⏳ Waiting for generation to complete...")
         print(f"   🔍 Looking for prompt: {prompt[:60]}...")
@@ -560,16 +624,17 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                     
                     # Search for all divs containing the prompt text
                     prompt_elements = page.locator(f'xpath=//span[contains(@class, "prompt-value-container")]')
-                    count = prompt_elements.count()
+                    # Read every record's text in one round-trip instead of one per record
+                    texts = prompt_elements.all_inner_texts()
                     
-                    print(f"   📊 Found {count} total prompt elements on page")
+                    print(f"   📊 Found {len(texts)} total prompt elements on page")
                     
                     # Look through all elements and find matches with our exact prompt
                     matching_items = []
-                    for i in range(count):
+                    for i, text in enumerate(texts):
                         try:
                             element = prompt_elements.nth(i)
-                            text = element.inner_text().strip()
+                            text = text.strip()
                             
                             # Check if this matches our prompt (exact match or close match)
                             if prompt.strip() == text or prompt[:50] in text or text[:50] in prompt:
@@ -593,7 +658,7 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                                 })
                                 
                                 print(f"   📝 Match {len(matching_items)}: index {i}, processing={has_processing}, images={has_images}")
-                        except:
+                        except Exception:
                             continue
                     
                     if matching_items:
@@ -634,21 +699,22 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                 print(f"   🔄 Refreshing page (F5) and checking again...")
                 
                 page.reload(wait_until="domcontentloaded")
-                time.sleep(3)
                 
-                # Wait a bit more and check again
-                time.sleep(5)
+                # Wait for the generation records to render instead of sleeping
+                try:
+                    page.locator('span[class*="prompt-value-container"]').first.wait_for(state="visible", timeout=15000)
+                except PlaywrightTimeoutError:
+                    print("   ⚠️  Generation records not visible after refresh, continuing...")
                 
                 # Quick check after F5 - look for our prompt with processing text OR completed images
                 try:
                     prompt_elements = page.locator(f'xpath=//span[contains(@class, "prompt-value-container")]')
-                    count = prompt_elements.count()
                     found_after_refresh = False
                     
-                    for i in range(count):
+                    for i, text in enumerate(prompt_elements.all_inner_texts()):
                         try:
                             element = prompt_elements.nth(i)
-                            text = element.inner_text().strip()
+                            text = text.strip()
                             
                             if prompt.strip() == text or prompt[:50] in text:
                                 item_candidate = element.locator('xpath=ancestor::div[contains(@class, "item-")]').first
@@ -663,7 +729,7 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                                     found_valid_item = True
                                     found_after_refresh = True
                                     break
-                        except:
+                        except Exception:
                             continue
                     
                     if found_after_refresh:
@@ -713,7 +779,7 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                             
                         time.sleep(3)
                         
-                    except:
+                    except Exception:
                         # If we can't find the text, assume it's done
                         break
                         
@@ -750,8 +816,8 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                 print(f"   ⚠️  Error counting images: {e}")
                 time.sleep(3)
         
-        # Step 4: Click each image to get full resolution URL and download
-        print(f"   📥 Downloading images by clicking each one...")
+        # Step 4: Click each image to get its full resolution URL
+        print(f"   🔍 Collecting image URLs by clicking each one...")
         
         img_elements = item_div.locator('img')
         img_count = img_elements.count()
@@ -759,7 +825,8 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
         if img_count < expected_images:
             print(f"   ⚠️  Only found {img_count} images, expected {expected_images}")
         
-        downloaded_count = 0
+        # Pass 1 only walks the UI to collect URLs; downloads happen together afterwards
+        image_jobs = []
         
         for i in range(min(img_count, expected_images)):
             try:
@@ -874,7 +941,7 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                                         found_resolution = resolution
                                         print(f"   ✅ Found {resolution} resolution image at index {j}")
                                     break
-                    except:
+                    except Exception:
                         continue
                 
                 # Fallback: if no specific resolution found, try to find any non-360 image
@@ -890,7 +957,7 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                                     full_res_src = src
                                     print(f"   ✅ Found non-360 image at index {j}")
                                     break
-                        except:
+                        except Exception:
                             continue
                 
                 if not full_res_src:
@@ -907,20 +974,10 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                 
                 print(f"   🔗 Image URL {i+1}: {full_res_src[:80]}...")
                 
-                # Step 4.3: Download the image
+                # Step 4.3: Queue the image for download
                 filename = f"prompt_{hash(prompt) & 0xFFFFFFFF}_{i+1}.webp"
-                filepath = os.path.join(output_dir, filename)
-                
-                print(f"   📥 Downloading to {filename}...")
-                response = page.context.request.get(full_res_src)
-                
-                if response.ok:
-                    with open(filepath, 'wb') as f:
-                        f.write(response.body())
-                    print(f"   ✅ Downloaded image {i+1}: {filename}")
-                    downloaded_count += 1
-                else:
-                    print(f"   ❌ Failed to download image {i+1}: HTTP {response.status}")
+                image_jobs.append((full_res_src, Path(output_dir) / filename))
+                print(f"   📋 Queued {filename} for download")
                 
                 # Step 4.4: Close modal by clicking X button
                 print(f"   ❌ Closing modal...")
@@ -934,10 +991,31 @@ def wait_and_download_images(page: Page, prompt: str, aspect_ratio: str, output_
                 # Try to close modal if still open
                 try:
                     close_modal(page)
-                except:
+                except Exception:
                     pass
         
-        print(f"\n   ✅ Downloaded {downloaded_count}/{expected_images} images")
+        # Step 5: Download all collected images concurrently
+        # (a one-off client is built here: reading browser cookies must stay on the Playwright thread)
+        owns_client = http_client is None
+        if image_jobs and owns_client:
+            http_client = browser_http_client(page)
+        
+        if image_jobs and download_executor is not None:
+            if len(image_jobs) < expected_images:
+                # Still save what was found; the future's count marks the prompt incomplete
+                print(f"\n   ⚠️  Only found {len(image_jobs)}/{expected_images} image(s)")
+            
+            print(f"\n   📥 Downloading {len(image_jobs)} image(s) in the background...")
+            future = download_executor.submit(_download_collected, http_client, image_jobs, expected_images, owns_client)
+            download_futures.append((prompt, expected_images, future))
+            return True
+        
+        downloaded_count = 0
+        if image_jobs:
+            print(f"\n   📥 Downloading {len(image_jobs)} image(s)...")
+            downloaded_count = _download_collected(http_client, image_jobs, expected_images, owns_client)
+        else:
+            print(f"\n   ✅ Downloaded 0/{expected_images} images")
         return downloaded_count >= expected_images
         
     except Exception as e:
@@ -958,7 +1036,6 @@ def convert_to_high_res(url: str, aspect_ratio: str) -> str:
     Returns:
         Modified URL with high-res dimensions
     """
-    import re
     from config import get_aspect_ratio_dimensions
     
     # Get target dimensions based on aspect ratio
@@ -989,13 +1066,33 @@ def convert_to_high_res(url: str, aspect_ratio: str) -> str:
     
     # Replace the resize parameter
     # Pattern: aigc_resize:360:360 or similar
-    pattern = r'aigc_resize:\d+:\d+'
     replacement = f'aigc_resize:{target_res}'
     
-    new_url = re.sub(pattern, replacement, url)
+    new_url = _RESIZE_RE.sub(replacement, url)
     
     return new_url
 
+# Popups that can cover the generation page after closing the image modal
+_POPUPS = (
+    ("/html/body/div[5]/div[2]", "div[5]"),
+    ("/html/body/div[6]/div[2]/div", "div[6]"),
+)
+
+def _exit_button_xpaths(popup_xpath: str) -> tuple:
+    """XPath unions for exit buttons inside a popup: close-button class first, then fallbacks"""
+    close_button = f'{popup_xpath}//*[self::button or self::div or self::span][contains(@class, "close-button")]'
+    fallback = " | ".join([
+        f'{popup_xpath}//button[contains(@class, "close")]',
+        f'{popup_xpath}//button[contains(@class, "exit")]',
+        f'{popup_xpath}//button[contains(text(), "✕")]',
+        f'{popup_xpath}//button[contains(text(), "×")]',
+        f'{popup_xpath}//button[contains(text(), "Close")]',
+        f'{popup_xpath}//button[contains(text(), "Exit")]',
+        f'{popup_xpath}//span[contains(@class, "close")]',
+        f'{popup_xpath}//div[contains(@class, "close")]',
+    ])
+    return (("close-button class", close_button), ("fallback", fallback))
+
 def close_modal(page: Page) -> bool:
     """
     Close the image detail modal by clicking the X button
@@ -1022,124 +1119,54 @@ def close_modal(page: Page) -> bool:
     except Exception as e:
         print(f"   ⚠️  Failed to close main modal: {e}")
     
-    # Check for and close additional popup at /html/body/div[5]/div[2]
+    # Check for and close additional popups at div[5] / div[6] with a single wait
     try:
-        additional_popup_xpath = "/html/body/div[5]/div[2]"
-        additional_popup = page.locator(f'xpath={additional_popup_xpath}')
+        popups = page.locator(f'xpath={" | ".join(xpath for xpath, _ in _POPUPS)}')
         
-        # Wait briefly to see if popup exists
-        additional_popup.wait_for(state="visible", timeout=2000)
+        # Wait briefly to see if either popup exists
+        popups.first.wait_for(state="visible", timeout=2000)
         
-        if additional_popup.count() > 0:
-            print("   📱 Found additional popup at div[5], closing...")
-            
-            # Try to find and click exit/close button within the popup
-            exit_button_selectors = [
-                f'xpath={additional_popup_xpath}//button[contains(@class, "close-button")]',  # Button with close-button class
-                f'xpath={additional_popup_xpath}//div[contains(@class, "close-button")]',    # Div with close-button class
-                f'xpath={additional_popup_xpath}//span[contains(@class, "close-button")]',   # Span with close-button class
-                f'xpath={additional_popup_xpath}//button[contains(@class, "close")]',
-                f'xpath={additional_popup_xpath}//button[contains(@class, "exit")]',
-                f'xpath={additional_popup_xpath}//button[contains(text(), "✕")]',
-                f'xpath={additional_popup_xpath}//button[contains(text(), "×")]',
-                f'xpath={additional_popup_xpath}//button[contains(text(), "Close")]',
-                f'xpath={additional_popup_xpath}//button[contains(text(), "Exit")]',
-                f'xpath={additional_popup_xpath}//span[contains(@class, "close")]',
-                f'xpath={additional_popup_xpath}//div[contains(@class, "close")]',
-            ]
+        for popup_xpath, label in _POPUPS:
+            if page.locator(f'xpath={popup_xpath}').count() == 0:
+                continue
             
+            print(f"   📱 Found popup at {label}, closing...")
             popup_closed = False
             
-            for selector in exit_button_selectors:
+            # div[6] popup has a known close button; try it first
+            if label == "div[6]":
+                close_button = page.locator('xpath=/html/body/div[6]/div[2]/div/div[2]/div[2]/div/div')
                 try:
-                    exit_button = page.locator(selector)
-                    if exit_button.count() > 0:
-                        element_type = "close-button class" if "close-button" in selector else "fallback"
-                        print(f"   🖱️  Clicking {element_type} exit button in popup...")
-                        exit_button.first.click()
+                    close_button.wait_for(state="visible", timeout=3000)
+                    if close_button.count() > 0:
+                        print(f"   🖱️  Clicking close button in div[6] popup...")
+                        close_button.first.click()
                         popup_closed = True
-                        print(f"   ✅ Closed popup with {element_type} button")
+                        print("   ✅ Closed div[6] popup with specific close button")
                         time.sleep(0.5)
-                        break
                 except Exception as e:
-                    continue
+                    print(f"   ⚠️  Specific close button failed: {e}")
             
-            # If no exit button found, try pressing Escape
+            # Try to find and click exit/close button within the popup (close-button class first)
             if not popup_closed:
-                print("   ⌨️  No exit button found, pressing Escape...")
-                page.keyboard.press("Escape")
-                popup_closed = True
-                print("   ✅ Closed popup with Escape key")
-                time.sleep(0.5)
-            
-    except Exception as e:
-        # Popup doesn't exist or already closed
-        pass
-
-    # Check for and close popup at /html/body/div[6]/div[2]/div
-    try:
-        popup_div6_xpath = "/html/body/div[6]/div[2]/div"
-        popup_div6 = page.locator(f'xpath={popup_div6_xpath}')
-        
-        # Wait briefly to see if popup exists
-        popup_div6.wait_for(state="visible", timeout=2000)
-        
-        if popup_div6.count() > 0:
-            print("   📱 Found popup at div[6], closing...")
-            
-            # First try to click the specific close button
-            close_button_xpath = "/html/body/div[6]/div[2]/div/div[2]/div[2]/div/div"
-            close_button = page.locator(f'xpath={close_button_xpath}')
-            
-            popup_closed = False
-            
-            try:
-                close_button.wait_for(state="visible", timeout=3000)
-                if close_button.count() > 0:
-                    print(f"   🖱️  Clicking close button in div[6] popup...")
-                    close_button.first.click()
-                    popup_closed = True
-                    print("   ✅ Closed div[6] popup with specific close button")
-                    time.sleep(0.5)
-            except Exception as e:
-                print(f"   ⚠️  Specific close button failed: {e}")
-            
-            # If specific button doesn't work, try other selectors
-            if not popup_closed:
-                exit_button_selectors = [
-                    f'xpath={popup_div6_xpath}//button[contains(@class, "close-button")]',  # Button with close-button class
-                    f'xpath={popup_div6_xpath}//div[contains(@class, "close-button")]',    # Div with close-button class
-                    f'xpath={popup_div6_xpath}//span[contains(@class, "close-button")]',   # Span with close-button class
-                    f'xpath={popup_div6_xpath}//button[contains(@class, "close")]',
-                    f'xpath={popup_div6_xpath}//button[contains(@class, "exit")]',
-                    f'xpath={popup_div6_xpath}//button[contains(text(), "✕")]',
-                    f'xpath={popup_div6_xpath}//button[contains(text(), "×")]',
-                    f'xpath={popup_div6_xpath}//button[contains(text(), "Close")]',
-                    f'xpath={popup_div6_xpath}//button[contains(text(), "Exit")]',
-                    f'xpath={popup_div6_xpath}//span[contains(@class, "close")]',
-                    f'xpath={popup_div6_xpath}//div[contains(@class, "close")]',
-                ]
-                
-                for selector in exit_button_selectors:
+                for element_type, exit_xpath in _exit_button_xpaths(popup_xpath):
                     try:
-                        exit_button = page.locator(selector)
+                        exit_button = page.locator(f'xpath={exit_xpath}')
                         if exit_button.count() > 0:
-                            element_type = "close-button class" if "close-button" in selector else "fallback"
-                            print(f"   🖱️  Clicking {element_type} exit button in div[6] popup...")
+                            print(f"   🖱️  Clicking {element_type} exit button in {label} popup...")
                             exit_button.first.click()
                             popup_closed = True
-                            print(f"   ✅ Closed div[6] popup with {element_type} button")
+                            print(f"   ✅ Closed {label} popup with {element_type} button")
                             time.sleep(0.5)
                             break
                     except Exception as e:
                         continue
             
-            # Final fallback for div[6] popup - try pressing Escape
+            # If no exit button found, try pressing Escape
             if not popup_closed:
-                print("   ⌨️  No exit button found for div[6], pressing Escape...")
+                print(f"   ⌨️  No exit button found for {label}, pressing Escape...")
                 page.keyboard.press("Escape")
-                popup_closed = True
-                print("   ✅ Closed div[6] popup with Escape key")
+                print(f"   ✅ Closed {label} popup with Escape key")
                 time.sleep(0.5)
             
     except Exception as e:
@@ -1168,22 +1195,20 @@ def detect_available_resolutions(page: Page) -> list:
         count = all_imgs.count()
         
         resolutions = set()
-        resolution_pattern = r'(\d+):(\d+)'
         
         for i in range(min(count, 20)):  # Check first 20 images max
             try:
                 img = all_imgs.nth(i)
                 src = img.get_attribute('src')
                 if src:
-                    import re
-                    matches = re.findall(resolution_pattern, src)
+                    matches = _RESOLUTION_RE.findall(src)
                     for match in matches:
                         width, height = match
                         if int(width) >= 360 and int(height) >= 360:  # Only valid resolutions
                             # Also check for ultra-high resolutions
                             if int(width) <= 4096 and int(height) <= 4096:  # Up to 4K max
                                 resolutions.add(f"{width}:{height}")
-            except:
+            except Exception:
                 continue
         
         # Sort by resolution (highest first)